@@ -0,0 +1,478 @@
+import functools
+import json
+import os
+import queue
+import shutil
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import IO
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Self
+from typing import Tuple
+
+import moderngl
+from attr import Factory
+from attr import define
+from attr import field
+
+from Broken.Base import BrokenThread
+from Broken.Externals.FFmpeg import BrokenFFmpeg
+from Broken.Logging import log
+from Broken.Types import Hertz
+from Broken.Types import Seconds
+from ShaderFlow.Profiler import TRACER
+from ShaderFlow.Profiler import ShaderProfiler
+
+
+@define
+class ShaderReadback:
+    """
+    Asynchronous FBO readback on a ring of Pixel Buffer Objects
+
+    • Reading into a PBO returns immediately, the GPU copies the pixels once it's done rendering
+    • The oldest PBO on the ring is only mapped when it's about to be reused, frame N-length
+    • A length of zero falls back to synchronous reads straight from the FBO
+    """
+    scene:    Any = field(default=None, repr=False)
+    length:   int = 2
+    _buffers: Deque[moderngl.Buffer] = Factory(deque)
+    _pending: int = 0
+    _size:    int = 0
+
+    def _make(self, size: int) -> None:
+        """(Re)create the ring of buffers for a given frame size in bytes"""
+        log.info(f"Creating Readback ring of ({self.length}) PBOs with ({size/1024**2:.2f} MB) each")
+        self.release()
+        self._size = size
+        for _ in range(self.length):
+            self._buffers.append(self.scene.opengl.buffer(reserve=size))
+
+    def read_into(self,
+        fbo: moderngl.Framebuffer,
+        acquire: Callable[[], bytearray],
+        components: int=3,
+    ) -> Optional[bytearray]:
+        """
+        Queue a read of the FBO's pixels, copies the oldest pending frame once the ring is full
+
+        Args:
+            `fbo`:        Framebuffer to read the pixels from
+            `acquire`:    Returns a preallocated buffer to copy a finished frame into
+            `components`: Number of color components to read
+
+        Returns:
+            Buffer holding the frame queued `length` reads ago, None while the ring is filling up
+        """
+        if (self.length < 1):
+            fbo.read_into(target := acquire(), components=components)
+            return target
+
+        # Recreate buffers on first read or resolution changes
+        if (size := fbo.width*fbo.height*components) != self._size:
+            if self._pending:
+                raise RuntimeError(log.error("Readback frame size changed with pending frames"))
+            self._make(size)
+
+        # The next slot holds the oldest frame when the ring is full
+        buffer = self._buffers[0]
+        target = None
+        if (self._pending == self.length):
+            buffer.read_into(target := acquire())
+        fbo.read_into(buffer, components=components)
+        self._buffers.rotate(-1)
+        self._pending = min(self._pending + 1, self.length)
+        return target
+
+    def flush_into(self, acquire: Callable[[], bytearray]) -> Iterable[bytearray]:
+        """Copy all pending frames into acquired buffers, oldest first"""
+        for buffer in list(self._buffers)[len(self._buffers) - self._pending:]:
+            buffer.read_into(target := acquire())
+            yield target
+        self._pending = 0
+
+    def release(self) -> Self:
+        while self._buffers:
+            self._buffers.pop().release()
+        self._pending = 0
+        self._size = 0
+        return self
+
+# -------------------------------------------------------------------------------------------------|
+
+@define
+class ShaderFrameWriter:
+    """
+    Writes frames to FFmpeg on a background thread, decoupled from the render loop
+
+    • Frames are read straight into a bounded pool of preallocated buffers, no per-frame allocations
+    • The render loop only blocks when all buffers are in flight, that is, the queue is full
+    • The pool outlives close(), so the writer can be retargeted to a new FFmpeg per segment
+    """
+    ffmpeg: BrokenFFmpeg = field(default=None, repr=False)
+    depth:  int = 4
+    size:   int = 0
+    profiler: ShaderProfiler = field(default=None, repr=False)
+
+    _free:  queue.Queue = Factory(queue.Queue)
+    _queue: queue.Queue = Factory(queue.Queue)
+    _size:  int = 0
+    _error: Exception = None
+    _running: bool = False
+
+    # Statistics
+    stall:     Seconds = 0.0
+    frames:    int = 0
+    written:   int = 0
+    occupancy: int = 0
+    maximum:   int = 0
+
+    @property
+    def average(self) -> float:
+        """Average number of queued frames at the time a new one was submitted"""
+        return self.occupancy/(self.frames or 1)
+
+    @property
+    def queued(self) -> int:
+        """Number of frames waiting to be written right now"""
+        return self._queue.qsize()
+
+    def _make(self) -> None:
+        log.info(f"Creating Writer pool of ({self.depth}) buffers with ({self.size/1024**2:.2f} MB) each")
+        self._free = queue.Queue()
+        self._size = self.size
+        for _ in range(max(1, self.depth)):
+            self._free.put(bytearray(self.size))
+
+    def _start(self) -> None:
+        BrokenThread.new(self._worker, daemon=True)
+
+    def _worker(self) -> None:
+        while (buffer := self._queue.get()) is not None:
+            try:
+                if self._error is None:
+                    start = time.perf_counter()
+                    with TRACER.span("FFmpeg write"):
+                        self.ffmpeg.write(memoryview(buffer))
+                    self.written += len(buffer)
+                    if self.profiler:
+                        self.profiler.add("write", time.perf_counter() - start)
+            except Exception as error:
+                self._error = error
+            self._free.put(buffer)
+            self._queue.task_done()
+        self._queue.task_done()
+
+    def _raise(self) -> None:
+        if self._error is not None:
+            raise RuntimeError(log.error(f"FFmpeg Writer thread failed: {self._error}"))
+
+    def acquire(self) -> bytearray:
+        """Get a free buffer from the pool, blocks while the queue is full"""
+        if (self._size != self.size):
+            self._make()
+        if not self._running:
+            self._start()
+            self._running = True
+        self._raise()
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            start = time.perf_counter()
+            buffer = self._free.get()
+            self.stall += time.perf_counter() - start
+            return buffer
+
+    def submit(self, buffer: bytearray) -> None:
+        """Queue an acquired buffer to be written"""
+        self.occupancy += (queued := self._queue.qsize())
+        self.maximum = max(self.maximum, queued + 1)
+        self.frames += 1
+        self._queue.put(buffer)
+
+    def close(self) -> None:
+        """Wait for all queued frames to be written and stop the thread, keeps the buffers"""
+        if self._running:
+            self._queue.put(None)
+            self._queue.join()
+            self._running = False
+        self._raise()
+
+@define
+class ShaderImageWriter(ShaderFrameWriter):
+    """
+    Compresses frames to numbered image files on a pool of threads, for image sequence exports
+
+    • PIL and OpenCV release the GIL while compressing, throughput scales with the threads
+    • Files are numbered by their absolute frame index, partial ranges compose into one sequence
+    """
+    formats = ("png", "tif", "tiff", "jpg", "jpeg", "bmp", "webp", "exr")
+
+    directory: Path = field(default=None, converter=Path)
+    format:    str  = "png"
+    width:     int  = 1920
+    height:    int  = 1080
+    threads:   int  = 4
+    index:     int  = 0
+
+    _pool:     ThreadPoolExecutor = None
+    _futures:  Deque[Future] = Factory(deque)
+    _lock:     threading.Lock = Factory(threading.Lock)
+
+    def path(self, index: int) -> Path:
+        return self.directory/f"frame-{index:06d}.{self.format}"
+
+    @property
+    def queued(self) -> int:
+        return max(0, max(1, self.depth) - self._free.qsize())
+
+    def _start(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, self.threads))
+
+    def _encode(self, index: int, buffer: bytearray) -> None:
+        try:
+            if self._error is None:
+                start = time.perf_counter()
+                with TRACER.span("Image encode"):
+                    self._save(self.path(index), buffer)
+                with self._lock:
+                    self.written += len(buffer)
+                if self.profiler:
+                    self.profiler.add("write", time.perf_counter() - start)
+        except Exception as error:
+            self._error = error
+        self._free.put(buffer)
+
+    @staticmethod
+    @functools.cache
+    def _linear() -> Any:
+        """Lookup table of the 8 bits sRGB values to linear light, what EXR files hold"""
+        import numpy
+        srgb = numpy.arange(256, dtype=numpy.float32)/255
+        return numpy.where(srgb <= 0.04045, srgb/12.92, ((srgb + 0.055)/1.055)**2.4).astype(numpy.float32)
+
+    def _save(self, path: Path, buffer: bytearray) -> None:
+        if (self.format == "exr"):
+            os.environ.setdefault("OPENCV_IO_ENABLE_OPENEXR", "1")
+            import cv2
+            import numpy
+            frame = numpy.frombuffer(buffer, dtype=numpy.uint8).reshape(self.height, self.width, 3)
+            if not cv2.imwrite(str(path), self._linear()[frame[..., ::-1]]):
+                raise OSError(f"OpenCV failed to write ({path})")
+            return
+        import PIL.Image
+        PIL.Image.frombuffer("RGB", (self.width, self.height), buffer, "raw", "RGB", 0, 1).save(path)
+
+    def submit(self, buffer: bytearray) -> None:
+        """Compress an acquired buffer as the next frame of the sequence"""
+        self.occupancy += (queued := max(1, self.depth) - self._free.qsize() - 1)
+        self.maximum = max(self.maximum, queued + 1)
+        self.frames += 1
+        while self._futures and self._futures[0].done():
+            self._futures.popleft()
+        self._futures.append(self._pool.submit(self._encode, self.index, buffer))
+        self.index += 1
+
+    def close(self) -> None:
+        """Wait for all frames to be compressed and stop the pool, keeps the buffers"""
+        if self._running:
+            wait(self._futures)
+            self._futures.clear()
+            self._pool.shutdown()
+            self._running = False
+        self._raise()
+
+# -------------------------------------------------------------------------------------------------|
+
+@define
+class ShaderSegments:
+    """
+    Splits a render's time range in segments rendered independently, concatenated losslessly
+
+    • Segments are aligned to whole frames, so their concatenation matches a single render
+    • Files are written as Matroska for a safe stream copy on FFmpeg's concat demuxer
+    • A manifest checkpoints finished segments, an interrupted render resumes from the missing ones
+    """
+    directory: Path    = field(default=None, converter=Path)
+    fps:       Hertz   = 60.0
+    start:     Seconds = 0.0
+    stop:      Seconds = 10.0
+    suffix:    str     = ".mkv"
+    parts:     int     = 1
+    done:      Dict[int, Tuple[int, int]] = Factory(dict)
+
+    @property
+    def first(self) -> int:
+        return round(self.start*self.fps)
+
+    @property
+    def last(self) -> int:
+        return round(self.stop*self.fps)
+
+    def split(self, parts: int) -> List[Tuple[int, int]]:
+        """Split the frames range in contiguous (first, last) frame segments"""
+        frames = (self.last - self.first)
+        return [(
+            self.first + (frames*(index + 0))//parts,
+            self.first + (frames*(index + 1))//parts,
+        ) for index in range(parts)]
+
+    @property
+    def manifest(self) -> Path:
+        return self.directory/"manifest.json"
+
+    def _header(self) -> dict:
+        return dict(fps=self.fps, start=self.start, stop=self.stop, parts=self.parts)
+
+    def save(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.manifest.write_text(json.dumps(dict(
+            **self._header(),
+            done=[dict(index=index, first=first, last=last, file=self.path(index).name)
+                for index, (first, last) in sorted(self.done.items())],
+        ), indent=2))
+
+    def load(self) -> bool:
+        """Load finished segments of a previous render with the same settings, False if unusable"""
+        try:
+            manifest = json.loads(self.manifest.read_text())
+        except (OSError, ValueError):
+            return False
+        if {key: manifest.get(key) for key in self._header()} != self._header():
+            log.warning(f"Segments manifest ({self.manifest}) is from a render with different settings")
+            return False
+        for segment in manifest.get("done", []):
+            if (self.directory/segment["file"]).exists():
+                self.done[segment["index"]] = (segment["first"], segment["last"])
+        return True
+
+    def plan(self, parts: int, resume: bool=False) -> List[Tuple[int, int, int]]:
+        """Split the render in segments, returns the (index, first, last) frames of the missing ones"""
+        self.parts = parts
+        self.done.clear()
+        if not (resume and self.load()):
+            self.remove()
+            self.done.clear()
+        self.save()
+        if self.done:
+            log.info(f"Resuming render with ({len(self.done)}/{parts}) segments finished")
+        return [(index, first, last)
+            for index, (first, last) in enumerate(self.split(parts))
+            if index not in self.done]
+
+    def mark(self, index: int) -> None:
+        """Checkpoint a fully written segment"""
+        self.done[index] = self.split(self.parts)[index]
+        self.save()
+
+    def path(self, index: int) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return self.directory/f"segment-{index:04d}{self.suffix}"
+
+    def concat(self) -> Path:
+        """Write the concat demuxer's file list of all segments"""
+        listing = self.directory/"concat.txt"
+        listing.write_text("\n".join(
+            f"file '{self.path(index).as_posix()}'"
+            for index in range(self.parts)
+        ))
+        return listing
+
+    def remove(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+# -------------------------------------------------------------------------------------------------|
+
+@define
+class ShaderProgress:
+    """
+    Machine readable render progress, one JSON object per line, for render farm orchestrators
+
+    • Targets: `-` for stdout, `fd:N` for an inherited file descriptor, `tcp://host:port`,
+      `unix:/path/to/socket`, or otherwise a file path to append to
+    • Progress lines are rate limited to one per `interval`, "start" and "done" are always sent
+    """
+    target:   str = None
+    interval: Seconds = 0.5
+    total:    int = 0
+    _stream:  IO = None
+    _socket:  socket.socket = None
+    _start:   float = 0.0
+    _last:    float = 0.0
+    _frames:  int = 0
+
+    def open(self) -> Self:
+        """Connect to the target, an unreachable one only warns and the render goes on"""
+        self._start = self._last = time.perf_counter()
+        try:
+            if (self.target == "-"):
+                self._stream = sys.stdout
+            elif self.target.startswith("fd:"):
+                self._stream = open(int(self.target[3:]), "w", buffering=1, closefd=False)
+            elif self.target.startswith("tcp://"):
+                host, port = self.target[6:].rsplit(":", 1)
+                self._socket = socket.create_connection((host, int(port)), timeout=10)
+                self._socket.settimeout(None)
+                self._stream = self._socket.makefile("w", buffering=1)
+            elif self.target.startswith("unix:"):
+                self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self._socket.connect(self.target[5:])
+                self._stream = self._socket.makefile("w", buffering=1)
+            else:
+                self._stream = open(self.target, "a", buffering=1)
+        except (OSError, ValueError) as error:
+            log.warning(f"Couldn't open the render progress stream ({self.target}), rendering without it: {error}")
+            self.close()
+        return self
+
+    def emit(self, event: str, **data) -> None:
+        if (self._stream is None):
+            return
+        try:
+            self._stream.write(json.dumps(dict(event=event, **data)) + "\n")
+            self._stream.flush()
+        except OSError as error:
+            log.warning(f"Render progress stream ({self.target}) failed, stopping it: {error}")
+            self._stream = None
+
+    def update(self, frames: int, force: bool=False, **data) -> None:
+        """Send a progress line if the interval passed, with the instantaneous and average speeds"""
+        if (self._stream is None):
+            return
+        now = time.perf_counter()
+        if (not force) and (now - self._last < self.interval):
+            return
+        average = frames/max(1e-9, now - self._start)
+        self.emit("progress",
+            frames=frames,
+            total=self.total,
+            fps=(frames - self._frames)/max(1e-9, now - self._last),
+            average=average,
+            eta=(self.total - frames)/max(1e-9, average),
+            elapsed=now - self._start,
+            **data,
+        )
+        self._last, self._frames = now, frames
+
+    def close(self, **data) -> None:
+        if (self._stream is not None):
+            self.emit("done", elapsed=time.perf_counter() - self._start, **data)
+            if (self._stream is not sys.stdout):
+                self._stream.close()
+            self._stream = None
+        if (self._socket is not None):
+            self._socket.close()
+            self._socket = None
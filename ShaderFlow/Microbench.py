@@ -0,0 +1,174 @@
+import json
+import random
+import time
+from pathlib import Path
+from typing import Callable
+from typing import Dict
+from typing import List
+
+import numpy
+from attr import Factory
+from attr import define
+
+from Broken.Logging import log
+from Broken.Types import Seconds
+
+# Benchmarks by name, each one a setup function returning the callable to time
+MICROBENCHMARKS: Dict[str, Callable[["ShaderMicrobench"], Callable[[], None]]] = {}
+
+def microbenchmark(function: Callable) -> Callable:
+    MICROBENCHMARKS[function.__name__] = function
+    return function
+
+@define
+class ShaderMicrobench:
+    """
+    Times the per-frame Python hot paths in isolation, with synthetic inputs of realistic sizes
+
+    • Each benchmark is the best per-call time of a few repeats, each repeat at least `duration` long
+    • Results are compared against a baseline JSON, regressions above `threshold` percent fail
+    """
+    duration:  Seconds = 0.2
+    repeats:   int     = 5
+    threshold: float   = 10
+    fps:       float   = 60
+    _scene:    object  = None
+    results:   Dict[str, Seconds] = Factory(dict)
+
+    @property
+    def scene(self):
+        """A headless Scene for the modules that need one, built only when first needed"""
+        if self._scene is None:
+            from ShaderFlow.Scene import ShaderScene
+            self._scene = ShaderScene()
+            self._scene.rendering = True
+            self._scene.headless = True
+            self._scene.fps = self.fps
+            self._scene.dt = self._scene.rdt = 1/self.fps
+            self._scene.build()
+        return self._scene
+
+    def time(self, call: Callable[[], None]) -> Seconds:
+        """Best per-call time of the repeats, calibrating the number of calls per repeat"""
+        number = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                call()
+            if (took := time.perf_counter() - start) >= self.duration/10:
+                break
+            number *= 2
+        number = max(1, int(number*self.duration/took))
+        best = took/max(1, number)
+        for _ in range(self.repeats):
+            start = time.perf_counter()
+            for _ in range(number):
+                call()
+            best = min(best, (time.perf_counter() - start)/number)
+        return best
+
+    def run(self, only: List[str]=None) -> Dict[str, Seconds]:
+        for name, setup in MICROBENCHMARKS.items():
+            if only and (name not in only):
+                continue
+            self.results[name] = self.time(setup(self))
+            log.info(f"• Microbenchmark ({name:>22}): ({self.results[name]*1e6:10.2f} µs) per call")
+        return self.results
+
+    def save(self, path: Path) -> Path:
+        path = Path(path)
+        path.write_text(json.dumps(self.results, indent=2))
+        log.info(f"Saved microbenchmarks baseline to ({path})")
+        return path
+
+    def compare(self, path: Path) -> List[str]:
+        """Names of the benchmarks slower than the baseline by more than the threshold"""
+        baseline = json.loads(Path(path).read_text())
+        regressed = []
+        for name, took in self.results.items():
+            if (before := baseline.get(name)) is None:
+                continue
+            change = 100*(took/before - 1)
+            if (change > self.threshold):
+                log.error(f"• Regression ({name}): ({before*1e6:.2f} µs) → ({took*1e6:.2f} µs), {change:+.1f}%")
+                regressed.append(name)
+            else:
+                log.info(f"• Compared ({name}): ({before*1e6:.2f} µs) → ({took*1e6:.2f} µs), {change:+.1f}%")
+        return regressed
+
+# -------------------------------------------------------------------------------------------------|
+
+def _audio(bench: ShaderMicrobench):
+    from ShaderFlow.Modules.Audio import BrokenAudio
+    audio = BrokenAudio()
+    audio.create_buffer()
+    audio.add_data(numpy.random.uniform(-1, 1, audio.shape).astype(audio.dtype))
+    return audio
+
+@microbenchmark
+def dynamic_number(bench: ShaderMicrobench) -> Callable[[], None]:
+    """A spectrogram's worth of second order systems, 2 channels of 1000 bins"""
+    from ShaderFlow.Modules.Dynamics import DynamicNumber
+    dynamics = DynamicNumber(value=numpy.zeros((2, 1000), numpy.float32), frequency=4, zeta=1, response=0)
+    targets = numpy.random.uniform(0, 1, (8, 2, 1000)).astype(numpy.float32)
+    state = iter(range(2**62))
+    return lambda: dynamics.next(target=targets[next(state) % 8], dt=1/bench.fps)
+
+@microbenchmark
+def audio_add_data(bench: ShaderMicrobench) -> Callable[[], None]:
+    """One frame of stereo 44.1 kHz audio into the default 20 seconds buffer"""
+    audio = _audio(bench)
+    chunk = numpy.random.uniform(-1, 1, (audio.channels, int(audio.samplerate/bench.fps))).astype(audio.dtype)
+    return lambda: audio.add_data(chunk)
+
+@microbenchmark
+def spectrogram_next(bench: ShaderMicrobench) -> Callable[[], None]:
+    """A 4096 samples FFT into 1000 octave scaled bins"""
+    from ShaderFlow.Modules.Spectrogram import BrokenSpectrogram
+    spectrogram = BrokenSpectrogram(audio=_audio(bench))
+    spectrogram.next()
+    return spectrogram.next
+
+@microbenchmark
+def waveform_update(bench: ShaderMicrobench) -> Callable[[], None]:
+    """Three seconds of 180 bars per second, new audio every frame"""
+    from ShaderFlow.Modules.Waveform import ShaderWaveform
+    audio = _audio(bench)
+    waveform = ShaderWaveform(scene=bench.scene, audio=audio)
+    chunk = numpy.random.uniform(-1, 1, (audio.channels, int(audio.samplerate/bench.fps))).astype(audio.dtype)
+    def call():
+        audio.add_data(chunk)
+        waveform.update()
+    return call
+
+@microbenchmark
+def piano_update(bench: ShaderMicrobench) -> Callable[[], None]:
+    """A dense piano roll of 88 keys with a note every quarter second on each"""
+    from ShaderFlow.Modules.Piano import ShaderPiano
+    from ShaderFlow.Notes import BrokenPianoNote
+    piano = ShaderPiano(scene=bench.scene)
+    generator = random.Random(0)
+    for note in range(21, 109):
+        for index in range(240):
+            start = index/4 + generator.uniform(0, 0.1)
+            piano.add_note(BrokenPianoNote(note=note, start=start, end=start + generator.uniform(0.05, 1),
+                velocity=generator.randint(40, 127)))
+    state = iter(range(2**62))
+    def call():
+        bench.scene.time = (next(state) % (60*bench.fps))/bench.fps
+        piano.update()
+    return call
+
+@microbenchmark
+def shader_pipeline(bench: ShaderMicrobench) -> Callable[[], None]:
+    """Iterating the full pipeline of a Scene's main shader, as on every render"""
+    shader = bench.scene.shader
+    return lambda: list(shader._full_pipeline())
+
+@microbenchmark
+def noise_at(bench: ShaderMicrobench) -> Callable[[], None]:
+    """A three dimensional noise of four octaves"""
+    from ShaderFlow.Modules.Noise import ShaderNoise
+    noise = ShaderNoise(scene=bench.scene, dimensions=3, octaves=4, roughness=0.5)
+    state = iter(range(2**62))
+    return lambda: noise.at(next(state)/bench.fps)
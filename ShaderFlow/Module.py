@@ -96,6 +96,12 @@ class ShaderModule(BrokenFluentBuilder, BrokenAttrs):
 
     @abstractmethod
     def ffmpeg(self, ffmpeg: BrokenFFmpeg) -> None:
+        """Add inputs to an export's FFmpeg, seeked to the Scene's `export_start`"""
+        pass
+
+    @abstractmethod
+    def destroy(self) -> None:
+        """Stop the Module's threads and free its resources, the Scene is being discarded"""
         pass
 
     # ------------------------------------------|
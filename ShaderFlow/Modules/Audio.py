@@ -2,6 +2,7 @@ import math
 import time
 from collections import deque
 from pathlib import Path
+from threading import Thread
 from typing import Any
 from typing import Deque
 from typing import Generator
@@ -12,7 +13,6 @@ from typing import Self
 from typing import Tuple
 
 import numpy
-import soundcard
 from attr import Factory
 from attr import define
 from attr import field
@@ -31,6 +31,7 @@ from Broken.Types import Samples
 from Broken.Types import Seconds
 from ShaderFlow.Module import ShaderModule
 from ShaderFlow.Modules.Dynamics import ShaderDynamics
+from ShaderFlow.Profiler import TRACER
 
 
 class BrokenAudioMode(BrokenEnum):
@@ -47,10 +48,20 @@ class BrokenAudio:
     read: int = 0
     """The number of samples to read from the audio so far"""
 
+    _running: bool = True
+    _threads: List[Thread] = Factory(list)
+
     def __post__(self):
         self.create_buffer()
-        BrokenThread.new(self._play_thread,   daemon=True)
-        BrokenThread.new(self._record_thread, daemon=True)
+        self._threads.append(BrokenThread.new(self._play_thread,   daemon=True))
+        self._threads.append(BrokenThread.new(self._record_thread, daemon=True))
+
+    def destroy(self) -> None:
+        """Stop and join the play and record threads"""
+        self._running = False
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self._threads.clear()
 
     @property
     def buffer_size(self) -> Samples:
@@ -75,8 +86,9 @@ class BrokenAudio:
             The data that was written
         """
         if (data := numpy.array(data, dtype=self.dtype)).any():
-            self.data = numpy.roll(self.data, -data.shape[1], axis=1)
-            self.data[:, -data.shape[1]:] = data
+            tail = data[:, -self.buffer_size:]
+            self.data = numpy.roll(self.data, -tail.shape[1], axis=1)
+            self.data[:, -tail.shape[1]:] = tail
             self.read += data.shape[1]
             return data
 
@@ -172,10 +184,12 @@ class BrokenAudio:
 
     @staticmethod
     def recorders() -> Iterable[Any]:
+        import soundcard
         yield from soundcard.all_microphones(include_loopback=True)
 
     @staticmethod
     def speakers() -> Iterable[Any]:
+        import soundcard
         yield from soundcard.all_speakers()
 
     @staticmethod
@@ -208,6 +222,7 @@ class BrokenAudio:
             Self, Fluent interface
         """
         (self.speaker or Ignore()).__exit__(None, None, None)
+        import soundcard
 
         # Search for the Speaker
         if name is None:
@@ -257,6 +272,7 @@ class BrokenAudio:
             Self, Fluent interface
         """
         self.close_recorder()
+        import soundcard
 
         # Search for default loopback device
         if name is None:
@@ -294,9 +310,12 @@ class BrokenAudio:
         return self.add_data(self.recorder.record(numframes=numframes).T)
 
     def _record_thread(self) -> None:
-        while True:
+        while self._running:
+            mark = TRACER.now()
             if (self.record() is None):
                 time.sleep(0.01)
+                continue
+            TRACER.complete("Audio record", mark)
 
     # # Playing
 
@@ -309,11 +328,12 @@ class BrokenAudio:
         self._play_queue.append(data)
 
     def _play_thread(self) -> None:
-        while True:
+        while self._running:
             if not self._play_queue:
                 time.sleep(0.01)
                 continue
-            self.speaker.play(self._play_queue.popleft().T)
+            with TRACER.span("Audio play"):
+                self.speaker.play(self._play_queue.popleft().T)
 
     # ------------------------------------------|
     # Properties utils
@@ -343,6 +363,9 @@ class ShaderAudio(BrokenAudio, ShaderModule):
     std:     ShaderDynamics = None
     final:   bool = True
 
+    _streamed: Seconds = 0.0
+    """Seconds of audio read from the file stream so far"""
+
     def __post__(self):
         self.volume = ShaderDynamics(
             scene=self.scene, name=f"{self.name}Volume",
@@ -367,13 +390,22 @@ class ShaderAudio(BrokenAudio, ShaderModule):
 
     def ffmpeg(self, ffmpeg: BrokenFFmpeg) -> None:
         if self.final:
+            if (start := self.scene.export_start):
+                ffmpeg.custom("-ss", start)
             ffmpeg.input(self.file)
 
     def update(self):
         try:
             if self._file_stream:
                 self._file_reader.chunk = self.scene.frametime
+
+                # Catch up when rendering starts mid-file, as on segments
+                if self.scene.rendering:
+                    behind = (self.scene.time - self._streamed)
+                    self._file_reader.chunk = max(self.scene.frametime, behind)
+
                 data = next(self._file_stream).T
+                self._streamed += data.shape[1]/self.samplerate
                 self.add_data(data)
                 self.play(data)
         except StopIteration:
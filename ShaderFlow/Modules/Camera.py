@@ -34,7 +34,6 @@ from typing import Self
 from typing import Union
 
 import numpy
-import quaternion
 from attr import define
 
 from Broken.BrokenEnum import BrokenEnum
@@ -50,10 +49,16 @@ from ShaderFlow.Variable import ShaderVariable
 
 # -------------------------------------------------------------------------------------------------|
 
-Quaternion = quaternion.quaternion
 Vector3D   = numpy.ndarray
 _dtype     = numpy.float32
 
+# numpy-quaternion is only imported once a Camera is set up or rotated (PEP 562)
+def __getattr__(name: str):
+    if (name == "Quaternion"):
+        import quaternion
+        return quaternion.quaternion
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 class GlobalBasis:
     Origin = numpy.array((0, 0, 0), dtype=_dtype)
     Null   = numpy.array((0, 0, 0), dtype=_dtype)
@@ -96,7 +101,7 @@ class CameraMode(BrokenEnum):
 
 class Algebra:
 
-    def rotate_vector(vector: Vector3D, R: Quaternion) -> Vector3D:
+    def rotate_vector(vector: Vector3D, R: "Quaternion") -> Vector3D:
         """
         Applies a Quaternion rotation to a vector.
 
@@ -115,12 +120,14 @@ class Algebra:
         # Potential speed gains, need to verify
         # if sum(quaternion.as_float_array(R)[1:]) < 1e-6:
             # return vector
+        import quaternion
         return quaternion.as_vector_part(R * quaternion.quaternion(0, *vector) * R.conjugate())
 
-    def quaternion(axis: Vector3D, angle: Degrees) -> Quaternion:
+    def quaternion(axis: Vector3D, angle: Degrees) -> "Quaternion":
         """Builds a quaternion that represents an rotation around an axis for an angle"""
+        import quaternion
         theta = math.radians(angle/2)
-        return Quaternion(math.cos(theta), *(math.sin(theta)*axis))
+        return quaternion.quaternion(math.cos(theta), *(math.sin(theta)*axis))
 
     def angle(A: Vector3D, B: Vector3D) -> Degrees:
         """
@@ -175,6 +182,7 @@ class ShaderCamera(ShaderModule):
     dolly:      ShaderDynamics = None
 
     def __post__(self):
+        import quaternion
         self.position = ShaderDynamics(scene=self.scene,
             name=f"{self.name}Position", real=True,
             frequency=7, zeta=1, response=1,
@@ -187,7 +195,7 @@ class ShaderCamera(ShaderModule):
         self.rotation = ShaderDynamics(scene=self.scene,
             name=f"{self.name}Rotation", real=True,
             frequency=5, zeta=1, response=0,
-            value=Quaternion(1, 0, 0, 0)
+            value=quaternion.quaternion(1, 0, 0, 0)
         )
         self.up = ShaderDynamics(scene=self.scene,
             name=f"{self.name}UP", real=True,
@@ -250,6 +258,7 @@ class ShaderCamera(ShaderModule):
         Returns:
             Self: Fluent interface
         """
+        import quaternion
         self.rotation.target = Algebra.quaternion(direction, angle) * self.rotation.target
         self.rotation.target /= numpy.linalg.norm(quaternion.as_float_array(self.rotation.target))
 
@@ -1,33 +1,174 @@
+import json
 from collections import deque
+from pathlib import Path
+from time import perf_counter
 from typing import Deque
+from typing import Dict
+from typing import List
+from typing import Tuple
 
-import imgui
 import numpy
 from attr import Factory
 from attr import define
 
+from Broken.Logging import log
+from Broken.Types import Seconds
 from ShaderFlow.Module import ShaderModule
 
 
 @define
 class ShaderFrametimer(ShaderModule):
-    frametimes: Deque[float] = Factory(deque)
+    """
+    Frametimes on a fixed size ring array, updated in constant time every frame
+
+    • Average is a running sum, lows are the mean of the slowest tail found with numpy.partition
+    • Order statistics are only computed when asked for, on a preallocated scratch copy of the ring
+    """
     history: float = 2
 
+    _ring:    numpy.ndarray = None
+    _scratch: numpy.ndarray = None
+    _index:  int = 0
+    _count:  int = 0
+    _sum:    float = 0.0
+
+    modules: Dict[Tuple[int, str], Deque[Seconds]] = Factory(dict)
+    """Rolling durations of each (module uuid, stage) pair, such as update, pipeline or render"""
+
+    _names: Dict[int, str] = Factory(dict)
+
+    budget: Seconds = None
+    """Watchdog's maximum work time of a frame, defaults to the frametime"""
+
+    slow: Deque[dict] = Factory(lambda: deque(maxlen=64))
+    """Ring buffer of the last slow frames and where their time went"""
+
+    _frame: Dict[Tuple[int, str], Seconds] = Factory(dict)
+    """Summed durations of each (module uuid, stage) pair on the current frame"""
+
     @property
     def length(self) -> int:
         return max(int(self.history * self.scene.fps), 1)
 
     # Framerate manipulation
 
-    def update(self):
-        self.frametimes.append(self.scene.rdt)
-        while len(self.frametimes) > self.length:
-            self.frametimes.popleft()
+    @property
+    def frametimes(self) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """Frametimes on the window as two views of the ring, the older ones then the newer ones"""
+        if self._ring is None:
+            return (numpy.zeros(0, dtype=numpy.float32),)*2
+        if (self._count < len(self._ring)):
+            return (self._ring[:self._count], self._ring[:0])
+        return (self._ring[self._index:], self._ring[:self._index])
+
+    @property
+    def _window(self) -> numpy.ndarray:
+        """Frametimes on the window, in no particular order"""
+        return self._ring[:self._count]
+
+    def _resize(self, length: int) -> None:
+        """Recreate the ring for a new window length, keeping the newest frametimes"""
+        kept = numpy.concatenate(self.frametimes)[-length:]
+        self._ring = numpy.zeros(length, dtype=numpy.float32)
+        self._scratch = numpy.zeros(length, dtype=numpy.float32)
+        self._ring[:len(kept)] = kept
+        self._count = len(kept)
+        self._index = (self._count % length)
+        self._sum = float(kept.sum())
+        self.modules = {key: deque(times, maxlen=length) for key, times in self.modules.items()}
 
-    def percent(self, percent: float=1) -> float:
-        cut = int(len(self.frametimes) * (percent/100))
-        return numpy.sort(self.frametimes)[-cut:]
+    def update(self):
+        if (self._ring is None) or (len(self._ring) != self.length):
+            self._resize(self.length)
+
+        # Replace the oldest frametime once the ring is full
+        if (self._count == len(self._ring)):
+            self._sum -= float(self._ring[self._index])
+        else:
+            self._count += 1
+
+        self._ring[self._index] = self.scene.rdt
+        self._sum += float(self._ring[self._index])
+        self._index = (self._index + 1) % len(self._ring)
+
+        # Amortized O(1) resync of the running sum's float errors
+        if (self._index == 0):
+            self._sum = float(self._ring.sum())
+
+    # Per module timings
+
+    def record(self, module: ShaderModule, stage: str, took: Seconds, current: bool=True) -> None:
+        """
+        Add a duration of some stage of a module, names are only made once
+
+        • Only `current` durations, spent on this very frame, are blamed by the slow frames watchdog
+        • GPU query results are from some frames ago, they go to the rolling timings alone
+        """
+        key = (module.uuid, stage)
+        if key not in self.modules:
+            self.modules[key] = deque(maxlen=self.length)
+            self._names[module.uuid] = f"{module.uuid:>2} - {type(module).__name__.replace('Shader', '')}"
+        self.modules[key].append(took)
+        if current and self.scene.realtime:
+            self._frame[key] = self._frame.get(key, 0.0) + took
+
+    def lap(self, module: ShaderModule, stage: str, mark: Seconds) -> Seconds:
+        """Record the time since a mark as a module's stage, returns a new mark"""
+        now = perf_counter()
+        self.record(module, stage, now - mark)
+        return now
+
+    def timings(self) -> List[Tuple[str, str, Seconds, Seconds]]:
+        """(Module, Stage, Average, Maximum) of all timings, most expensive first"""
+        return sorted((
+            (self._names[uuid], stage, sum(times)/len(times), max(times))
+            for (uuid, stage), times in self.modules.items() if times
+        ), key=lambda timing: timing[2], reverse=True)
+
+    # Slow frames watchdog
+
+    def watchdog(self, took: Seconds) -> None:
+        """Called at the end of every frame, keeps and logs frames that went over the budget"""
+        frame, self._frame = self._frame, {}
+        if not self.scene.realtime:
+            return
+        if (took <= (budget := (self.budget or self.scene.frametime))):
+            return
+        breakdown = sorted(((uuid, stage, spent) for (uuid, stage), spent in frame.items()),
+            key=lambda item: item[2], reverse=True)
+        self.slow.append(dict(
+            frame=self.scene.frame,
+            time=self.scene.time,
+            took=took,
+            budget=budget,
+            breakdown=[dict(module=self._names[uuid], stage=stage, took=spent) for uuid, stage, spent in breakdown],
+        ))
+        log.warning((
+            f"{self.who} Slow frame ({self.scene.frame}) took ({took*1000:.2f} ms) over ({budget*1000:.2f} ms): " +
+            ", ".join(f"{self._names[uuid].split(' - ')[-1]} {stage} ({spent*1000:.2f} ms)" for uuid, stage, spent in breakdown[:3])
+        ))
+
+    def dump(self, path: Path=None) -> List[dict]:
+        """Log the slow frames ring buffer, optionally saving it as JSON"""
+        log.info(f"{self.who} Last ({len(self.slow)}) slow frames:")
+        for slow in self.slow:
+            log.info(f"• Frame ({slow['frame']}) at ({slow['time']:.2f}s) took ({slow['took']*1000:.2f} ms)")
+            for item in slow["breakdown"][:8]:
+                log.info(f"  • ({item['took']*1000:7.3f} ms) {item['stage']:<8} {item['module']}")
+        if path:
+            Path(path).write_text(json.dumps(list(self.slow), indent=2))
+            log.info(f"{self.who} Saved slow frames to ({path})")
+        return list(self.slow)
+
+    def percent(self, percent: float=1) -> numpy.ndarray:
+        """The slowest percent of the frametimes, at least one, a view valid until the next call"""
+        if not (count := self._count):
+            return numpy.zeros(0, dtype=numpy.float32)
+        cut = max(1, int(count * (percent/100)))
+        scratch = self._scratch[:count]
+        scratch[:] = self._window
+        scratch.partition(count - cut)
+        return scratch[-cut:]
 
     def __safe__(self, value):
         return value if value < 1e8 else 0
@@ -35,16 +176,18 @@ class ShaderFrametimer(ShaderModule):
     # # Frametimes
 
     def frametime_average(self, percent: float=100) -> float:
+        if (percent >= 100):
+            return self._sum / (self._count + 1e-9)
         frametimes = self.percent(percent)
-        return sum(frametimes) / (len(frametimes) + 1e-9)
+        return float(frametimes.sum()) / (len(frametimes) + 1e-9)
 
     @property
     def frametime_maximum(self) -> float:
-        return max(self.frametimes)
+        return float(self._window.max()) if self._count else 0
 
     @property
     def frametime_minimum(self) -> float:
-        return min(self.frametimes)
+        return float(self._window.min()) if self._count else 0
 
     # # Framerates
 
@@ -59,22 +202,49 @@ class ShaderFrametimer(ShaderModule):
     def framerate_minimum(self) -> float:
         return self.__safe__(1.0 / (self.frametime_maximum + 1e-9))
 
+    def stats(self) -> Dict[str, float]:
+        """Framerate statistics of the window, for displaying or exporting"""
+        return dict(
+            target=self.scene.fps,
+            average=self.framerate_average(100),
+            low_10=self.framerate_average(10),
+            low_1=self.framerate_average(1),
+            low_01=self.framerate_average(0.1),
+            maximum=self.framerate_maximum,
+            minimum=self.framerate_minimum,
+            frames=self._count,
+        )
+
     # ShaderFlow
 
     def ui(self):
+        import imgui
+
+        # Plot the ring in place, starting from the oldest frametime
+        if (ring := self._ring) is None:
+            return
         imgui.plot_lines(
             (
                 f"Target  {self.scene.fps:7.3f} fps\n"
                 f"Average {self.framerate_average(100):7.3f} fps\n"
-                # f"Low 10% {self.framerate_average(10):7.3f} fps\n"
-                # f"Low  1% {self.framerate_average(1):7.3f} fps\n"
+                f"Low 10% {self.framerate_average(10):7.3f} fps\n"
+                f"Low  1% {self.framerate_average(1):7.3f} fps\n"
+                f"Low .1% {self.framerate_average(0.1):7.3f} fps\n"
                 f"Maximum {self.framerate_maximum:7.3f} fps\n"
                 f"Minimum {self.framerate_minimum:7.3f} fps\n"
             ),
-            numpy.array(self.frametimes, dtype=numpy.float32),
+            ring,
+            values_count = self._count,
+            values_offset = (self._index if (self._count == len(ring)) else 0),
             scale_min = 0,
             graph_size = (0, 70)
         )
 
         if (state := imgui.input_float("History (Seconds)", self.history, 0.5, 0.5, "%.2f"))[0]:
             self.history = max(0, state[1])
+
+        if imgui.tree_node("Modules timings"):
+            imgui.text(f"{'Average':>9} {'Maximum':>9}  {'Stage':<8} Module")
+            for module, stage, average, maximum in self.timings():
+                imgui.text(f"{average*1000:6.3f} ms {maximum*1000:6.3f} ms  {stage:<8} {module}")
+            imgui.tree_pop()
@@ -1,15 +1,18 @@
 import functools
+from typing import TYPE_CHECKING
 from typing import Dict
 from typing import Iterable
 
 from attr import Factory
 from attr import define
-from moderngl_window.context.base import BaseKeys as ModernglKeys
 
 from ShaderFlow.Message import Message
 from ShaderFlow.Module import ShaderModule
 from ShaderFlow.Variable import ShaderVariable
 
+if TYPE_CHECKING:
+    from moderngl_window.context.base import BaseKeys as ModernglKeys
+
 
 @functools.lru_cache(maxsize=None)
 def __camel__(name: str) -> str:
@@ -24,11 +27,11 @@ class ShaderKeyboard(ShaderModule):
     _pressed: Dict[int, bool] = Factory(dict)
 
     @staticmethod
-    def set_keymap(keymap: ModernglKeys) -> None:
+    def set_keymap(keymap: "ModernglKeys") -> None:
         ShaderKeyboard.DirKeys = {key: getattr(keymap, key) for key in dir(keymap) if not key.startswith("_")}
         ShaderKeyboard.Keys = keymap
 
-    def pressed(self, key: int | ModernglKeys=None) -> bool:
+    def pressed(self, key: "int | ModernglKeys"=None) -> bool:
         return self._pressed.setdefault(key, False)
 
     def __call__(self, *a, **k) -> bool:
@@ -3,7 +3,6 @@ import random
 from typing import Iterable
 
 import numpy
-import opensimplex
 from attr import Factory
 from attr import define
 
@@ -34,6 +33,7 @@ class ShaderNoise(ShaderModule):
 
     @dimensions.setter
     def dimensions(self, value):
+        import opensimplex
         self.__dimensions__ = value
         self.__simplex__ = [
             opensimplex.OpenSimplex(seed=self.seed + dimension*1000)
@@ -49,7 +49,7 @@ class ShaderNoise(ShaderModule):
         }[self.dimensions]
 
     # Noise generator
-    __simplex__: opensimplex.OpenSimplex = None
+    __simplex__: "opensimplex.OpenSimplex" = None
 
     def __init__(self, dimensions: int=1, *args, **kwargs):
         self.__attrs_init__(*args, **kwargs)
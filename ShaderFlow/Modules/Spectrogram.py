@@ -7,8 +7,6 @@ from typing import Union
 
 import cachetools
 import numpy
-import samplerate
-import scipy
 from attr import Factory
 from attr import define
 from attr import field
@@ -178,6 +176,7 @@ class BrokenSpectrogram:
 
         # Optionally resample the data
         if self.sample_rateio != 1:
+            import samplerate
             data = numpy.array([samplerate.resample(x, self.sample_rateio, 'linear') for x in data])
 
         return self.magnitude_function(
@@ -207,7 +206,7 @@ class BrokenSpectrogram:
 
     @property
     @cachetools.cached(cache={}, key=lambda self: self.__cache__())
-    def spectrogram_matrix(self) -> scipy.sparse.csr_matrix:
+    def spectrogram_matrix(self) -> "scipy.sparse.csr_matrix":
         """
         Gets a transformation matrix that multiplied with self.fft yields "spectrogram bins" in custom scale
 
@@ -231,6 +230,7 @@ class BrokenSpectrogram:
         matrix[numpy.abs(matrix) < 1e-5] = 0
 
         # Create a scipy sparse for much faster matrix multiplication
+        import scipy.sparse
         return scipy.sparse.csr_matrix(matrix)
 
     def from_notes(self,
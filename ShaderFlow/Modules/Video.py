@@ -3,14 +3,14 @@ import io
 import time
 from collections import deque
 from pathlib import Path
+from threading import Thread
 from typing import Any
 from typing import Callable
 from typing import Dict
+from typing import List
 from typing import Tuple
 
-import cv2
 import numpy
-import PIL
 from attr import Factory
 from attr import define
 
@@ -22,6 +22,7 @@ from Broken.Logging import log
 from Broken.Types import Hertz
 from Broken.Types import Seconds
 from ShaderFlow.Module import ShaderModule
+from ShaderFlow.Profiler import TRACER
 from ShaderFlow.Texture import ShaderTexture
 
 
@@ -39,6 +40,8 @@ class BrokenSmartVideoFrames(BrokenAttrs):
     _turbo:   Any     = None
     _raw:     deque   = Factory(deque)
     _frames:  Dict    = Factory(dict)
+    _running: bool    = True
+    _threads: List[Thread] = Factory(list)
 
     # Dynamically set
     encode:  Callable = None
@@ -85,21 +88,32 @@ class BrokenSmartVideoFrames(BrokenAttrs):
 
         elif BrokenUtils.have_import("cv2"):
             log.success("Using OpenCV for compression. Slower than TurboJPEG but enough")
+            import cv2
             self.encode = lambda frame: cv2.imencode(".jpeg", frame)[1]
             self.decode = lambda frame: cv2.imdecode(frame, cv2.IMREAD_COLOR)
 
         else:
             log.warning("Using PIL for compression. Performance killer GIL fallback")
+            import PIL.Image
             self.decode = lambda frame: PIL.Image.open(io.BytesIO(frame))
             self.encode = lambda frame: PIL.Image.fromarray(frame).save(
                 io.BytesIO(), format="jpeg", quality=self.quality
             )
 
         # Create worker threads. The good, the bad and the ugly
-        BrokenThread(target=self.extractor, daemon=True)
-        BrokenThread(target=self.deleter,   daemon=True)
+        self._threads.append(BrokenThread.new(target=self.extractor, daemon=True))
+        self._threads.append(BrokenThread.new(target=self.deleter,   daemon=True))
         for _ in range(self.threads):
-            BrokenThread(target=self.worker, daemon=True)
+            self._threads.append(BrokenThread.new(target=self.worker, daemon=True))
+
+    def destroy(self) -> None:
+        """Stop and join the worker threads, dropping all buffered frames"""
+        self._running = False
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self._threads.clear()
+        self._frames.clear()
+        self._raw.clear()
 
     # # Utilities
 
@@ -158,50 +172,60 @@ class BrokenSmartVideoFrames(BrokenAttrs):
 
     def extractor(self):
         def forward():
+            mark = TRACER.now()
             for index, frame in enumerate(BrokenFFmpeg.get_frames(self.path)):
+                TRACER.complete("Video decode", mark)
+
+                if not self._running:
+                    return
 
                 # Skip already processed frames
                 if self._frames.get(index) is not None:
+                    mark = TRACER.now()
                     continue
 
                 # Skip frames outside of the past time window
                 if not self._past_window(index):
+                    mark = TRACER.now()
                     continue
 
                 while not self._future_window(index):
-                    if self._should_rewind(index):
+                    if self._should_rewind(index) or (not self._running):
                         return
                     time.sleep(0.01)
 
                 # Limit how much raw frames there can be
-                while len(self._raw) > self.max_raw:
+                while (len(self._raw) > self.max_raw) and self._running:
                     time.sleep(0.01)
 
                 self._raw.append((index, frame))
                 self._newest = max(self._newest, index)
+                mark = TRACER.now()
 
-        while True:
+        while self._running:
             forward()
 
     def worker(self):
         """Blindly get new frames from the deque, compress and store them"""
-        while True:
+        while self._running:
             try:
                 index, frame = self._raw.popleft()
-                frame = numpy.array(numpy.flip(frame, axis=0))
-                self._frames[index] = self.encode(frame)
+                with TRACER.span("Video encode"):
+                    frame = numpy.array(numpy.flip(frame, axis=0))
+                    self._frames[index] = self.encode(frame)
             except IndexError:
                 time.sleep(0.01)
 
     def deleter(self):
         """Delete old frames that are not in the time window"""
-        while True:
-            for index in range(self._oldest, self._past_index):
-                self._frames[index] = None
-                self._oldest = index
-            for index in range(self._newest, self._future_index, -1):
-                self._frames[index] = None
-                self._newest = index
+        while self._running:
+            with TRACER.span("Video delete"):
+                for index in range(self._oldest, self._past_index):
+                    self._frames[index] = None
+                    self._oldest = index
+                for index in range(self._newest, self._future_index, -1):
+                    self._frames[index] = None
+                    self._newest = index
             time.sleep(0.5)
 
 # -------------------------------------------------------------------------------------------------|
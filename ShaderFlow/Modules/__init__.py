@@ -1,13 +1,52 @@
+import importlib
+
 from .. import *
 
-# isort: off
-from .Keyboard    import *
-from .Dynamics    import *
-from .Camera      import *
-from .Noise       import *
-from .Audio       import *
-from .Spectrogram import *
-from .Frametimer  import *
-from .Piano       import *
-from .Video       import *
-from .Waveform    import *
\ No newline at end of file
+# Modules are imported on first attribute access (PEP 562), as they pull heavy dependencies
+# such as scipy, soundcard, cv2 or opensimplex that the CLI and scene listing never need
+_LAZY = {
+    "ShaderKeyboard":   "Keyboard",
+    "DynamicNumber":    "Dynamics",
+    "ShaderDynamics":   "Dynamics",
+    "ShaderCamera":     "Camera",
+    "CameraMode":       "Camera",
+    "CameraProjection": "Camera",
+    "GlobalBasis":      "Camera",
+    "Algebra":          "Camera",
+    "Quaternion":       "Camera",
+    "Vector3D":         "Camera",
+    "ShaderNoise":      "Noise",
+    "BrokenAudio":      "Audio",
+    "BrokenAudioMode":  "Audio",
+    "ShaderAudio":      "Audio",
+    "BrokenSpectrogram":                   "Spectrogram",
+    "BrokenAudioFourierMagnitude":         "Spectrogram",
+    "BrokenAudioFourierVolume":            "Spectrogram",
+    "BrokenAudioSpectrogramInterpolation": "Spectrogram",
+    "BrokenAudioSpectrogramScale":         "Spectrogram",
+    "BrokenAudioSpectrogramWindow":        "Spectrogram",
+    "ShaderSpectrogram":                   "Spectrogram",
+    "ShaderFrametimer": "Frametimer",
+    "BrokenPiano":      "Piano",
+    "ShaderPiano":      "Piano",
+    "BucketInterval":   "Piano",
+    "BucketTree":       "Piano",
+    "MAX_NOTE":         "Piano",
+    "MAX_CHANNELS":     "Piano",
+    "BrokenSmartVideoFrames": "Video",
+    "ShaderVideo":            "Video",
+    "WaveformReducer":  "Waveform",
+    "ShaderWaveform":   "Waveform",
+}
+
+__all__ = list(_LAZY)
+
+def __getattr__(name: str):
+    if (module := _LAZY.get(name)) is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"{__name__}.{module}"), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
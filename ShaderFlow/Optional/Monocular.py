@@ -1,10 +1,9 @@
 import hashlib
+from typing import TYPE_CHECKING
 from typing import Any
 
 import numpy
 import PIL
-import torch
-import transformers
 from attr import define
 from PIL import Image
 from ShaderFlow import SHADERFLOW
@@ -14,6 +13,10 @@ from Broken.Loaders.LoaderPIL import LoadableImage
 from Broken.Loaders.LoaderPIL import LoaderImage
 from Broken.Logging import log
 
+# Torch and Transformers take seconds to import, only do so when estimating
+if TYPE_CHECKING:
+    import torch
+
 
 @define
 class Monocular:
@@ -21,7 +24,8 @@ class Monocular:
     _processor: Any = None
 
     @property
-    def device(self) -> torch.device:
+    def device(self) -> "torch.device":
+        import torch
         if torch.cuda.is_available():
             return torch.device("cuda")
         return torch.device("cpu")
@@ -70,6 +74,9 @@ class Monocular:
         # -----------------------------------------------------------------------------------------|
         # Estimating
 
+        import torch
+        import transformers
+
         # Load the model
         if not all((self._model, self._processor)):
             HUGGINGFACE_MODEL = ("LiheYoung/depth-anything-large-hf")
@@ -0,0 +1,149 @@
+import json
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+import numpy
+from attr import Factory
+from attr import define
+
+from Broken.Logging import log
+from ShaderFlow import SHADERFLOW
+
+
+@define
+class ShaderPack:
+    """
+    A single file with a Scene's decoded textures, shader sources and metadata, memory mapped
+
+    • Textures are stored as the exact raw arrays uploaded to the GPU, no network, decode or flip
+    • Local files are only replaced while their modification time and size match the packed ones
+    • Layout: magic, little endian u64 header length, JSON header, then 64 bytes aligned blobs
+    """
+    path:      Path = None
+    recording: bool = False
+    header:    Dict[str, Any] = Factory(dict)
+    textures:  Dict[str, Tuple[numpy.ndarray, Optional[Tuple[int, int]]]] = Factory(dict)
+    files:     Dict[str, Tuple[bytes, Optional[Tuple[int, int]]]] = Factory(dict)
+    _mmap:     mmap.mmap = None
+    _base:     int = 0
+
+    magic   = b"SHADERFLOWPACK01"
+    version = 1
+    align   = 64
+
+    @staticmethod
+    def default(scene: str) -> Path:
+        """Where the pack of a Scene is saved to and looked for, by its class name"""
+        return SHADERFLOW.DIRECTORIES.CACHE/"Packs"/f"{scene.lower()}.sfpack"
+
+    @classmethod
+    def find(cls, scene: str) -> Optional["ShaderPack"]:
+        """Open the pack of a Scene, the SHADERFLOW_PACK environment variable or its default path"""
+        path = Path(os.environ.get("SHADERFLOW_PACK") or cls.default(scene))
+        if not path.exists():
+            return None
+        try:
+            return cls(path=path).open()
+        except (OSError, ValueError) as error:
+            log.warning(f"Ignoring invalid asset pack ({path}): {error}")
+            return None
+
+    @staticmethod
+    def _stat(path: str) -> Optional[Tuple[int, int]]:
+        """Modification time and size of a local file, None for URLs and missing files"""
+        try:
+            stat = Path(path).stat()
+        except (OSError, ValueError):
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _fresh(self, path: str, stat: Optional[list]) -> bool:
+        return (stat is None) or ((now := self._stat(path)) is None) or (tuple(stat) == now)
+
+    # # Loading
+
+    def open(self) -> "ShaderPack":
+        with open(self.path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if (self._mmap[:len(self.magic)] != self.magic):
+            raise ValueError("Not a ShaderFlow asset pack")
+        (length,) = struct.unpack_from("<Q", self._mmap, len(self.magic))
+        start = len(self.magic) + 8
+        self.header = json.loads(self._mmap[start:start + length])
+        if (self.header.get("version") != self.version):
+            raise ValueError(f"Unsupported pack version ({self.header.get('version')})")
+        self._base = -(-(start + length)//self.align)*self.align
+        log.info(f"Using asset pack ({self.path}) of ({len(self.header['textures'])}) textures")
+        return self
+
+    def texture(self, key: str) -> Optional[numpy.ndarray]:
+        """A read only array backed by the memory map, None if not packed or stale"""
+        if (self._mmap is None) or not (entry := self.header["textures"].get(key)):
+            return None
+        if not self._fresh(key, entry["stat"]):
+            return None
+        return numpy.frombuffer(self._mmap, dtype=entry["dtype"],
+            count=int(numpy.prod(entry["shape"])), offset=self._base + entry["offset"],
+        ).reshape(entry["shape"])
+
+    def file(self, key: str, path: Path=None) -> Optional[bytes]:
+        """A file's packed contents, `path` is the local file it might be stale against"""
+        if (self._mmap is None) or not (entry := self.header["files"].get(key)):
+            return None
+        if not self._fresh((path or key), entry["stat"]):
+            return None
+        offset = self._base + entry["offset"]
+        return self._mmap[offset:offset + entry["size"]]
+
+    def close(self) -> None:
+        if (self._mmap is not None):
+            self._mmap.close()
+            self._mmap = None
+
+    # # Recording
+
+    def add_texture(self, key: str, data: numpy.ndarray) -> None:
+        if self.recording:
+            self.textures[key] = (numpy.ascontiguousarray(data), self._stat(key))
+
+    def add_file(self, key: str, data: bytes, path: Path=None) -> None:
+        if self.recording:
+            self.files[key] = (data, self._stat(path or key))
+
+    def save(self, path: Path=None, **metadata) -> Path:
+        """Write the recorded assets, the header first then every blob aligned"""
+        path = Path(path or self.path)
+        blobs, offset = [], 0
+        header = dict(version=self.version, created=time.time(), metadata=metadata, textures={}, files={})
+
+        def place(data: bytes) -> int:
+            nonlocal offset
+            start, offset = offset, -(-(offset + len(data))//self.align)*self.align
+            blobs.append((start, data))
+            return start
+
+        for key, (array, stat) in self.textures.items():
+            header["textures"][key] = dict(offset=place(array.tobytes()),
+                shape=list(array.shape), dtype=array.dtype.str, stat=stat)
+        for key, (data, stat) in self.files.items():
+            header["files"][key] = dict(offset=place(data), size=len(data), stat=stat)
+
+        encoded = json.dumps(header).encode()
+        base = -(-(len(self.magic) + 8 + len(encoded))//self.align)*self.align
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(self.magic)
+            file.write(struct.pack("<Q", len(encoded)))
+            file.write(encoded)
+            for start, data in blobs:
+                file.seek(base + start)
+                file.write(data)
+        log.info(f"Saved ({len(self.textures)}) textures and ({len(self.files)}) files to asset pack ({path})")
+        return path
@@ -0,0 +1,312 @@
+import contextlib
+import json
+import os
+import threading
+import tracemalloc
+from collections import deque
+from pathlib import Path
+from time import perf_counter
+from typing import Any
+from typing import Deque
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+import moderngl
+import numpy
+from attr import Factory
+from attr import define
+
+from Broken.Logging import log
+from Broken.Types import Seconds
+
+
+@define
+class ShaderProfiler:
+    """
+    Collects the durations of named stages of every frame, for a breakdown of where time goes
+
+    • Stages are timed with laps, `mark = lap("stage", mark)`, the next one starts where it ended
+    • Disabled profilers only read the clock, nothing is stored in real time mode
+    • Samples go to float64 arrays preallocated for the expected frames, doubled if ever exceeded
+    • Adding is locked, image sequence encoder threads record their writes concurrently
+    """
+    enabled: bool = False
+    frames:  int  = 1
+    stages:  Dict[str, numpy.ndarray] = Factory(dict)
+    _counts: Dict[str, int] = Factory(dict)
+    _lock:   threading.Lock = Factory(threading.Lock)
+
+    def start(self, frames: int) -> None:
+        """Clear and enable for an expected number of samples per stage"""
+        self.clear()
+        self.frames = max(1, frames)
+        self.enabled = True
+
+    def mark(self) -> Seconds:
+        return perf_counter()
+
+    def lap(self, stage: str, mark: Seconds) -> Seconds:
+        """Record the time since a mark on a stage, returns a new mark"""
+        now = perf_counter()
+        if self.enabled:
+            self.add(stage, now - mark)
+        return now
+
+    def add(self, stage: str, took: Seconds) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if (times := self.stages.get(stage)) is None:
+                times = self.stages[stage] = numpy.empty(self.frames, dtype=numpy.float64)
+                self._counts[stage] = 0
+            if (count := self._counts[stage]) == len(times):
+                times = self.stages[stage] = numpy.resize(times, 2*len(times))
+            times[count] = took
+            self._counts[stage] = count + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.stages.clear()
+            self._counts.clear()
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """Statistics of each stage, times in milliseconds"""
+        report = {}
+        with self._lock:
+            samples = {stage: times[:self._counts[stage]]*1000 for stage, times in self.stages.items()}
+        for stage, times in samples.items():
+            if not times.size:
+                continue
+            report[stage] = dict(
+                count=int(times.size),
+                total=float(times.sum()),
+                min=float(times.min()),
+                mean=float(times.mean()),
+                p95=float(numpy.percentile(times, 95)),
+                p99=float(numpy.percentile(times, 99)),
+                max=float(times.max()),
+            )
+        return report
+
+    def log(self) -> Dict[str, Dict[str, float]]:
+        """Log a line per stage, returns the report"""
+        for stage, stats in (report := self.report()).items():
+            log.info((
+                f"• Stage ({stage:>8}): "
+                f"(min {stats['min']:7.3f} ms) "
+                f"(mean {stats['mean']:7.3f} ms) "
+                f"(p95 {stats['p95']:7.3f} ms) "
+                f"(p99 {stats['p99']:7.3f} ms) "
+                f"({stats['count']} samples)"
+            ))
+        return report
+
+    def save(self, path: Path, **extra) -> Path:
+        """Write the report and any extra information as JSON"""
+        path = Path(path)
+        path.write_text(json.dumps(dict(**extra, stages=self.report()), indent=2))
+        log.info(f"Saved stages breakdown to ({path})")
+        return path
+
+# -------------------------------------------------------------------------------------------------|
+
+@define
+class ShaderQueries:
+    """
+    Ring of OpenGL time elapsed queries, for the GPU time of a render pass
+
+    • A query's result is only read `latency` frames later, when the GPU has long finished it
+    • Reading the results never stalls the pipeline waiting for the current frame
+    """
+    opengl:  moderngl.Context = None
+    latency: int = 3
+    stage:   str = "gpu"
+    label:   str = "gpu"
+    _ring:   Deque[moderngl.Query] = Factory(deque)
+    _used:   int = 0
+
+    @contextlib.contextmanager
+    def time(self) -> Iterator[None]:
+        """Measure the GPU time of the commands issued within this context"""
+        if not self._ring:
+            self._ring.extend(self.opengl.query(time=True) for _ in range(max(1, self.latency)))
+        with self._ring[0]:
+            yield
+        self._ring.rotate(-1)
+        self._used = min(self._used + 1, len(self._ring))
+
+    def result(self) -> Optional[Seconds]:
+        """GPU time of the oldest query on the ring, once it's about to be reused"""
+        if (self._used < len(self._ring)):
+            return None
+        return self._ring[0].elapsed/1e9
+
+    def release(self) -> None:
+        while self._ring:
+            self._ring.pop().release()
+        self._used = 0
+
+# -------------------------------------------------------------------------------------------------|
+
+@define
+class ShaderTracer:
+    """
+    Collects spans from every thread on a ring buffer, saved as Chrome's trace_event JSON
+
+    • Appending to a bounded deque is atomic, threads record without any locks
+    • A disabled tracer returns a shared no-op context, nearly free on the hot paths
+    • The file opens directly on chrome://tracing or https://ui.perfetto.dev
+    """
+    enabled:  bool = False
+    length:   int  = 1_000_000
+    _events:  Deque[tuple] = Factory(deque)
+    _threads: Dict[int, str] = Factory(dict)
+
+    def start(self, length: int=None) -> None:
+        """Start recording, keeping the last `length` spans"""
+        self._events = deque(maxlen=(length or self.length))
+        self._threads.clear()
+        self.enabled = True
+
+    def now(self) -> Seconds:
+        return perf_counter()
+
+    def complete(self, name: str, start: Seconds, category: str="shaderflow") -> None:
+        """Record a span that started at some time and ends now"""
+        if not self.enabled:
+            return
+        end = perf_counter()
+        if (thread := threading.get_ident()) not in self._threads:
+            self._threads[thread] = threading.current_thread().name
+        self._events.append((name, category, thread, start, end - start))
+
+    def span(self, name: str, category: str="shaderflow") -> Any:
+        """Context manager recording a span of its body"""
+        if not self.enabled:
+            return _NOOP
+        return ShaderTracerSpan(tracer=self, name=name, category=category)
+
+    def save(self, path: Path) -> Path:
+        """Write the recorded spans as a Chrome trace JSON file"""
+        path, pid = Path(path), os.getpid()
+        events = [dict(ph="M", name="thread_name", pid=pid, tid=thread, args=dict(name=name))
+            for thread, name in list(self._threads.items())]
+        events.extend(dict(ph="X", name=name, cat=category, pid=pid, tid=thread, ts=start*1e6, dur=took*1e6)
+            for (name, category, thread, start, took) in list(self._events))
+        path.write_text(json.dumps(dict(traceEvents=events, displayTimeUnit="ms")))
+        log.info(f"Saved ({len(events)}) trace events to ({path})")
+        return path
+
+@define
+class ShaderTracerSpan:
+    tracer:   ShaderTracer
+    name:     str
+    category: str = "shaderflow"
+    start:    Seconds = 0.0
+
+    def __enter__(self) -> None:
+        self.start = perf_counter()
+
+    def __exit__(self, *args) -> None:
+        self.tracer.complete(self.name, self.start, self.category)
+
+_NOOP = contextlib.nullcontext()
+
+# The tracer shared by all threads and modules
+TRACER = ShaderTracer()
+
+# -------------------------------------------------------------------------------------------------|
+
+@define
+class ShaderAllocations:
+    """
+    Allocation profiling of the per-frame loop with tracemalloc snapshots between frames
+
+    • Call sites are ranked by the bytes and blocks they gained per frame, what frames leave behind
+    • Short lived allocations freed within the frame cancel out on snapshots, so the peak traced
+      memory above the frame's start is also measured per module, the churn that should be zero
+    """
+    enabled: bool = False
+    depth:   int  = 1
+    frames:  int  = 0
+    _before: tracemalloc.Snapshot = None
+    _base:   int = 0
+    sites:   Dict[str, List[int]] = Factory(dict)
+    modules: Dict[str, int] = Factory(dict)
+
+    _filters = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+    def start(self) -> None:
+        tracemalloc.start(self.depth)
+        self.enabled = True
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self.enabled = False
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(self._filters)
+
+    def frame_start(self) -> None:
+        if not self.enabled:
+            return
+        self._before = self._snapshot()
+        self._base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    def lap(self, name: str) -> None:
+        """Account the peak memory above the last lap to a module, restarting the peak"""
+        if not self.enabled:
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        self.modules[name] = self.modules.get(name, 0) + max(0, peak - self._base)
+        self._base = current
+        tracemalloc.reset_peak()
+
+    def frame_end(self) -> None:
+        if (not self.enabled) or (self._before is None):
+            return
+        for stat in self._snapshot().compare_to(self._before, "lineno"):
+            if (stat.size_diff <= 0) and (stat.count_diff <= 0):
+                continue
+            frame = stat.traceback[0]
+            site = self.sites.setdefault(f"{frame.filename}:{frame.lineno}", [0, 0])
+            site[0] += max(0, stat.size_diff)
+            site[1] += max(0, stat.count_diff)
+        self.frames += 1
+        self._before = None
+
+    def report(self, limit: int=25) -> Dict[str, Any]:
+        """Top call sites and modules, in bytes and blocks per frame"""
+        frames = max(1, self.frames)
+        return dict(
+            frames=self.frames,
+            sites=[dict(site=site, bytes=size/frames, blocks=count/frames)
+                for site, (size, count) in sorted(self.sites.items(),
+                    key=lambda item: item[1][0], reverse=True)[:limit]],
+            modules=[dict(module=name, bytes=size/frames)
+                for name, size in sorted(self.modules.items(),
+                    key=lambda item: item[1], reverse=True)],
+        )
+
+    def log(self, limit: int=25) -> Dict[str, Any]:
+        report = self.report(limit=limit)
+        log.info(f"Allocations per frame over ({report['frames']}) frames:")
+        for module in report["modules"]:
+            log.info(f"• Peak ({module['bytes']/1024:10.2f} KiB) on ({module['module']})")
+        for site in report["sites"]:
+            log.info(f"• Kept ({site['bytes']/1024:10.2f} KiB) ({site['blocks']:8.2f} blocks) at ({site['site']})")
+        return report
+
+    def save(self, path: Path, limit: int=100) -> Path:
+        path = Path(path)
+        path.write_text(json.dumps(self.report(limit=limit), indent=2))
+        log.info(f"Saved allocations report to ({path})")
+        return path
@@ -1,4 +1,27 @@
+// Samples the Scene's main shader to the window or the exported video's resolution
+// • Box filters each output pixel's footprint when downsampling, fractional SSAA
+// • Flips vertically when exporting, video rows start at the top
+
 void main() {
-    fragColor = texture(iScreen, astuv);
+    vec2 uv = astuv;
+    if (iFlip) uv.y = 1.0 - uv.y;
+
+    // How many screen texels fit on an output pixel
+    vec2 ratio = vec2(textureSize(iScreen, 0))/iResolution;
+
+    if (max(ratio.x, ratio.y) <= 1.0) {
+        fragColor = texture(iScreen, uv);
+    } else {
+        ivec2 taps = ivec2(ceil(ratio));
+        fragColor  = vec4(0.0);
+        for (int x = 0; x < taps.x; x++) {
+            for (int y = 0; y < taps.y; y++) {
+                vec2 offset = (vec2(x, y) + 0.5)/vec2(taps) - 0.5;
+                fragColor += texture(iScreen, uv + offset/iResolution);
+            }
+        }
+        fragColor /= float(taps.x*taps.y);
+    }
+
     fragColor.a = 1.0;
-}
\ No newline at end of file
+}
@@ -0,0 +1,44 @@
+// Packs the final image into planar YUV420 (I420) memory layout, FFmpeg's rawvideo yuv420p
+// • Single channel texture of (width) x (height*3/2) texels, read back row by row
+// • Rows [0, height) are the Y plane, the U and V planes follow, two chroma rows per texel row
+// • BT.601 limited range, matching FFmpeg's default RGB to YUV conversion
+
+vec3 rgb2yuv(vec3 rgb) {
+    return vec3(
+         16.0 + dot(rgb, vec3( 65.481, 128.553,  24.966)),
+        128.0 + dot(rgb, vec3(-37.797, -74.203, 112.000)),
+        128.0 + dot(rgb, vec3(112.000, -93.786, -18.214))
+    ) / 255.0;
+}
+
+// The final image is already flipped upright when exporting
+vec3 pixel(ivec2 xy) {
+    return texelFetch(iFinal, xy, 0).rgb;
+}
+
+void main() {
+    ivec2 size = textureSize(iFinal, 0);
+    ivec2 xy   = ivec2(gl_FragCoord.xy);
+
+    // Luma plane, one texel per pixel
+    if (xy.y < size.y) {
+        fragColor = vec4(rgb2yuv(pixel(xy)).x);
+        return;
+    }
+
+    // Chroma planes, (width/2) x (height/2) each, contiguous after the luma
+    int chroma_width = size.x/2;
+    int chroma_area  = chroma_width*(size.y/2);
+    int index  = (xy.y - size.y)*size.x + xy.x;
+    int plane  = index / chroma_area;
+    int offset = index % chroma_area;
+    ivec2 block = 2*ivec2(offset % chroma_width, offset / chroma_width);
+
+    // Subsample the 2x2 pixels block
+    vec3 rgb = (
+        pixel(block + ivec2(0, 0)) + pixel(block + ivec2(1, 0)) +
+        pixel(block + ivec2(0, 1)) + pixel(block + ivec2(1, 1))
+    ) / 4.0;
+
+    fragColor = vec4(rgb2yuv(rgb)[1 + plane]);
+}
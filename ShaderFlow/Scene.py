@@ -1,21 +1,17 @@
 import importlib
 import math
+import os
+import sys
 from abc import abstractmethod
 from collections import deque
 from pathlib import Path
-from typing import Annotated, Any, Deque, Dict, Iterable, List, Optional, Self, Tuple
+from typing import TYPE_CHECKING, Annotated, Any, Deque, Dict, Iterable, List, Optional, Self, Tuple
 from typer import Option
 
 
-import glfw
-import imgui
 import moderngl
-import PIL
-import tqdm
 from attr import Factory, define, field
 from dotmap import DotMap
-from moderngl_window.context.base import BaseWindow as ModernglWindow
-from moderngl_window.integrations.imgui import ModernglWindowRenderer as ModernglImgui
 
 import Broken
 import ShaderFlow
@@ -28,16 +24,29 @@ from Broken.Loaders.LoaderString import LoaderString
 from Broken.Logging import log
 from Broken.Types import Hertz, Seconds, Unchanged
 from ShaderFlow import SHADERFLOW
+from ShaderFlow.Exporting import ShaderFrameWriter
+from ShaderFlow.Exporting import ShaderImageWriter
+from ShaderFlow.Exporting import ShaderProgress
+from ShaderFlow.Exporting import ShaderReadback
+from ShaderFlow.Exporting import ShaderSegments
 from ShaderFlow.Message import Message
+from ShaderFlow.Profiler import TRACER
+from ShaderFlow.Profiler import ShaderAllocations
+from ShaderFlow.Profiler import ShaderProfiler
 from ShaderFlow.Module import ShaderModule
 from ShaderFlow.Modules.Audio import ShaderAudio
 from ShaderFlow.Modules.Camera import ShaderCamera
 from ShaderFlow.Modules.Dynamics import DynamicNumber
 from ShaderFlow.Modules.Frametimer import ShaderFrametimer
 from ShaderFlow.Modules.Keyboard import ShaderKeyboard
+from ShaderFlow.Packing import ShaderPack
 from ShaderFlow.Shader import Shader
 from ShaderFlow.Variable import ShaderVariable
 
+# Windowing and UI are only imported when a Scene is built, cold CLI startup must stay fast
+if TYPE_CHECKING:
+    from moderngl_window.context.base import BaseWindow as ModernglWindow
+    from moderngl_window.integrations.imgui import ModernglWindowRenderer as ModernglImgui
 
 class ShaderBackend(BrokenEnum):
     Headless = "headless"
@@ -60,25 +69,31 @@ class ShaderScene(ShaderModule):
     • engine: Scene's main engine, where the user's final shader is rendered to
     """
     _final: Shader = None
+    _yuv:   Shader = None
     shader: Shader = None
     camera: ShaderCamera = None
     keyboard: ShaderKeyboard = None
+    frametimer: ShaderFrametimer = None
 
     def build(self):
 
-        # Init Imgui
-        imgui.create_context()
-        self.imguio = imgui.get_io()
-        self.imguio.font_global_scale = SHADERFLOW.CONFIG.imgui.default("font_scale", 1.0)
-        self.imguio.fonts.add_font_from_file_ttf(
-            str(BROKEN.RESOURCES.FONTS/"DejaVuSans.ttf"),
-            16*self.imguio.font_global_scale,
-        )
+        # Headless Scenes never have a window nor an user interface
+        if self.headless:
+            self._backend = ShaderBackend.Headless
+        else:
+            import imgui
+            imgui.create_context()
+            self.imguio = imgui.get_io()
+            self.imguio.font_global_scale = SHADERFLOW.CONFIG.imgui.default("font_scale", 1.0)
+            self.imguio.fonts.add_font_from_file_ttf(
+                str(BROKEN.RESOURCES.FONTS/"DejaVuSans.ttf"),
+                16*self.imguio.font_global_scale,
+            )
 
         # Default modules
         self.init_window()
         log.info(f"{self.who} Adding default base Scene modules")
-        ShaderFrametimer(self)
+        self.frametimer = ShaderFrametimer(self)
         self.keyboard = ShaderKeyboard(scene=self)
         self.camera   = ShaderCamera(scene=self)
 
@@ -87,7 +102,7 @@ class ShaderScene(ShaderModule):
         self.shader = Shader(self)
         self.shader.texture.name = "iScreen"
         self.shader.texture.track = True
-        self._final = Shader(self)
+        self._final = Shader(self, name="iFinal")
         self._final.texture.components = 3
         self._final.texture.final = True
         self._final.texture.dtype = "f1"
@@ -105,10 +120,22 @@ class ShaderScene(ShaderModule):
     dt:         Seconds = 0.0
     rdt:        Seconds = 0.0
 
+    export_start: Seconds = 0.0
+    """Time of the first frame of the video being exported, where Modules seek their FFmpeg inputs"""
+
     # Base classes and utils for a Scene
     eloop:  BrokenEventLoop   = Factory(BrokenEventLoop)
     vsync:  BrokenEventClient = None
     ffmpeg: BrokenFFmpeg      = None
+    readback: ShaderReadback  = None
+    writer: ShaderFrameWriter = None
+    stats:  DotMap            = None
+    profiler: ShaderProfiler  = Factory(ShaderProfiler)
+    allocations: ShaderAllocations = Factory(ShaderAllocations)
+    gpu_queries: int          = 3
+    """Frames of latency of the GPU time queries of every shader pass, 0 disables them"""
+    pack: ShaderPack          = None
+    """Asset pack the textures and files are loaded from, or recorded to when packing"""
 
     @property
     def frametime(self) -> Seconds:
@@ -124,7 +151,8 @@ class ShaderScene(ShaderModule):
     @title.setter
     def title(self, value: str) -> None:
         log.info(f"{self.who} Changing Window Title to ({value})")
-        self.window.title = value
+        if (self.window is not None):
+            self.window.title = value
         self._title = value
 
     # # Resizable
@@ -137,9 +165,12 @@ class ShaderScene(ShaderModule):
     @resizable.setter
     def resizable(self, value: bool) -> None:
         log.info(f"{self.who} Changing Window Resizable to ({value})")
-        self.window.resizable = value
         self._resizable = value
+        if (self.window is None):
+            return
+        self.window.resizable = value
         if (self._backend == ShaderBackend.GLFW):
+            import glfw
             glfw.set_window_attrib(self.window._window, glfw.RESIZABLE, value)
 
     # # Visible
@@ -152,7 +183,8 @@ class ShaderScene(ShaderModule):
     @visible.setter
     def visible(self, value: bool) -> None:
         log.info(f"{self.who} Changing Window Visibility to ({value})")
-        self.window.visible = value
+        if (self.window is not None):
+            self.window.visible = value
         self._visible = value
 
     # # Resolution
@@ -165,8 +197,9 @@ class ShaderScene(ShaderModule):
     def resize(self, width: int=Unchanged, height: int=Unchanged) -> None:
         self._width, self._height = BrokenUtils.round_resolution(width, height)
         log.info(f"{self.who} Resizing window to resolution {self.resolution}")
-        self.opengl.screen.viewport = (0, 0, self.width, self.height)
-        self.window.size = self.resolution
+        if (self.window is not None):
+            self.opengl.screen.viewport = (0, 0, self.width, self.height)
+            self.window.size = self.resolution
 
     def read_screen(self) -> bytes:
         return self.opengl.screen.read(viewport=(0, 0, self.width, self.height), components=3)
@@ -238,7 +271,8 @@ class ShaderScene(ShaderModule):
     def window_vsync(self, value: bool) -> None:
         log.info(f"{self.who} Changing Window Native Vsync to ({value})")
         self._window_vsync = value
-        self.window.vsync = value
+        if (self.window is not None):
+            self.window.vsync = value
 
     # # Window Exclusive
 
@@ -251,18 +285,25 @@ class ShaderScene(ShaderModule):
     @exclusive.setter
     def exclusive(self, value: bool) -> None:
         log.info(f"{self.who} Changing Window Exclusive to ({value})")
-        self.window.mouse_exclusivity = value
+        if (self.window is not None):
+            self.window.mouse_exclusivity = value
         self._exclusive = value
 
     # # Focused
 
     @property
     def focused(self) -> bool:
+        if (self._backend != ShaderBackend.GLFW):
+            return False
+        import glfw
         return glfw.get_window_attrib(self.window._window, glfw.FOCUSED)
 
     @focused.setter
     def focused(self, value: bool) -> None:
         log.info(f"{self.who} Changing Window Focused to ({value})")
+        if (self._backend != ShaderBackend.GLFW):
+            return
+        import glfw
         if value: glfw.focus_window(self.window._window)
 
     # # Backend
@@ -276,13 +317,32 @@ class ShaderScene(ShaderModule):
     # Window attributes
     icon:      Path         = Broken.PROJECT.RESOURCES.ICON
     opengl:    moderngl.Context = None
-    window:    ModernglWindow   = None
+    window:    "ModernglWindow" = None
     render_ui: bool             = False
-    imgui:     ModernglImgui    = None
+    imgui:     "ModernglImgui"  = None
     imguio:    Any              = None
 
+    def init_headless(self) -> None:
+        """Create a windowless OpenGL context, preferring EGL for display-less Linux nodes"""
+        from moderngl_window.context.base import BaseKeys
+        log.info(f"{self.who} Creating Headless OpenGL Context")
+        log.info(f"{self.who} • Resolution: {self.resolution}")
+        ShaderKeyboard.set_keymap(BaseKeys)
+
+        # Note: Mesa's llvmpipe is used with LIBGL_ALWAYS_SOFTWARE=1 and no GPU
+        if (sys.platform == "linux"):
+            try:
+                self.opengl = moderngl.create_context(standalone=True, backend="egl", require=330)
+            except Exception as error:
+                log.warning(f"{self.who} Couldn't create an EGL context, falling back: {error}")
+        self.opengl = (self.opengl or moderngl.create_context(standalone=True, require=330))
+        log.info(f"{self.who} • Renderer:   {self.opengl.info['GL_RENDERER']}")
+
     def init_window(self) -> None:
         """Create the window and the OpenGL context"""
+        if (self.backend == ShaderBackend.Headless):
+            return self.init_headless()
+        from moderngl_window.integrations.imgui import ModernglWindowRenderer as ModernglImgui
         log.info(f"{self.who} Creating Window and OpenGL Context")
         log.info(f"{self.who} • Backend:    {self.backend}")
         log.info(f"{self.who} • Resolution: {self.resolution}")
@@ -316,6 +376,7 @@ class ShaderScene(ShaderModule):
 
         # Workaround: Implement file dropping for GLFW and Keys, parallel icon setting
         if (self._backend == ShaderBackend.GLFW):
+            import glfw
             glfw.set_drop_callback(self.window._window, self.__window_files_dropped_event__)
             BrokenThread.new(target=self.window.set_icon, icon_path=self.icon)
             ShaderKeyboard.Keys.LEFT_SHIFT = glfw.KEY_LEFT_SHIFT
@@ -346,6 +407,7 @@ class ShaderScene(ShaderModule):
 
             elif message.key == ShaderKeyboard.Keys.F2:
                 import arrow
+                import PIL.Image
                 time  = arrow.now().format("YYYY-MM-DD_HH-mm-ss")
                 image = PIL.Image.frombytes("RGB", self.resolution, self.read_screen())
                 image = image.transpose(PIL.Image.FLIP_TOP_BOTTOM)
@@ -353,6 +415,13 @@ class ShaderScene(ShaderModule):
                 BrokenThread.new(target=image.save, fp=path, mode="JPEG", quality=95)
                 log.minor(f"{self.who} ( F2) Saved Screenshot to ({path})")
 
+            elif message.key == ShaderKeyboard.Keys.F3:
+                import arrow
+                time = arrow.now().format("YYYY-MM-DD_HH-mm-ss")
+                path = Broken.PROJECT.DIRECTORIES.DATA/f"({time}) {self.__name__} Slow Frames.json"
+                log.minor(f"{self.who} ( F3) Dumping Slow Frames")
+                self.frametimer.dump(path)
+
             elif message.key == ShaderKeyboard.Keys.F11:
                 log.info(f"{self.who} (F11) Toggling Fullscreen")
                 self.fullscreen = not self.fullscreen
@@ -370,6 +439,7 @@ class ShaderScene(ShaderModule):
         yield ShaderVariable("uniform", "float", "iFrameRate",   self.fps)
         yield ShaderVariable("uniform", "int",   "iFrame",       self.frame)
         yield ShaderVariable("uniform", "bool",  "iRealtime",    self.realtime)
+        yield ShaderVariable("uniform", "bool",  "iFlip",        self.rendering)
         yield ShaderVariable("uniform", "vec2",  "iMouse",       self.mouse_gluv)
         yield ShaderVariable("uniform", "bool",  "iMouseInside", self.mouse_inside)
         for i in range(1, 6):
@@ -380,6 +450,7 @@ class ShaderScene(ShaderModule):
     def _render_ui(self):
         if not self.render_ui:
             return
+        import imgui
 
         self._final.texture.fbo().use()
         imgui.push_style_var(imgui.STYLE_WINDOW_BORDERSIZE, 0.0)
@@ -409,33 +480,62 @@ class ShaderScene(ShaderModule):
         imgui.render()
         self.imgui.render(imgui.get_draw_data())
 
-    def next(self, dt: float) -> Self:
+    def next(self, dt: float, time: Seconds=None, frame: int=None) -> Self:
+        """
+        Advance the Scene by a frame, updating all modules and rendering
+
+        Args:
+            `dt`:    Time since the last frame, limited to one second
+            `time`:  Optional exact time to render at, offline renders don't accumulate errors
+            `frame`: Optional exact frame number, float times don't always floor back to it
+        """
 
         # Limit maximum deltatime for framespikes or events catching up
         dt = min(dt, 1)
 
         # Temporal
         self.time_scale.next(dt=abs(dt))
-        self.time     += dt * self.time_scale
+        if (time is not None):
+            self.time  = time
+        else:
+            self.time += dt * self.time_scale
         self.dt        = dt * self.time_scale
         self.rdt       = dt
-        self.frame     = int(self.time * self.fps)
+        self.frame     = (frame if (frame is not None) else int(self.time * self.fps))
         self.vsync.fps = self.fps
 
         # Update modules in reverse order of addition
         # Note: Non-engine first as pipeline might change
+        # Note: Shaders' render time includes generating the modules' pipelines
+        self.allocations.frame_start()
+        start = mark = self.profiler.mark()
         for module in (self.modules):
             if not isinstance(module, Shader):
                 module.update()
+                self.allocations.lap(type(module).__name__)
+                TRACER.complete(type(module).__name__, mark)
+                mark = self.frametimer.lap(module, "update", mark)
+        self.profiler.add("modules", mark - start)
         for module in (self.modules):
             if isinstance(module, Shader):
                 module.update()
+                if self.allocations.enabled:
+                    self.allocations.lap(f"Shader {module.name}")
+                TRACER.complete(module.name, mark)
+                mark = self.frametimer.lap(module, "render", mark)
+        mark = self.profiler.lap("shaders", mark)
 
         self._render_ui()
+        self.allocations.lap("UI")
+        self.allocations.frame_end()
+        TRACER.complete("UI", mark)
+        mark = self.profiler.lap("ui", mark)
+        self.frametimer.watchdog(mark - start)
 
         # Fixme: https://github.com/glfw/glfw/pull/1426
         if not self.headless:
             if self.backend == ShaderBackend.GLFW:
+                import glfw
                 glfw.poll_events()
                 glfw.swap_buffers(self.window._window)
             else:
@@ -444,6 +544,7 @@ class ShaderScene(ShaderModule):
         return self
 
     def __ui__(self) -> None:
+        import imgui
 
         # Render status
         imgui.text(f"Resolution: {self.render_resolution} -> {self.resolution} @ {self.ssaa}x SSAA")
@@ -502,15 +603,34 @@ class ShaderScene(ShaderModule):
         except Exception:
             pass
 
+    def destroy(self) -> None:
+        """Stop all Modules' threads and release a headless OpenGL context, for reusing the process"""
+        for module in self.modules:
+            if (module is not self):
+                module.destroy()
+        if (self.window is None) and (self.opengl is not None):
+            self.opengl.release()
+            self.opengl = None
+
     _built: SameTracker = Factory(SameTracker)
 
+    script: Path = None
+    """File the Scene was loaded from, where parallel render workers load it again"""
+    _args: List[str] = Factory(list)
+
+    # Options that never open a window, the Scene is built headless for them
+    _headless_flags = ("--render", "-r", "--benchmark", "-b", "--output", "-o")
+
     def cli(self, *args: List[str]):
-        args = flatten(args)
+        args = self._args = list(map(str, flatten(args)))
+        if any(str(arg).split("=")[0] in self._headless_flags for arg in args):
+            self.headless = True
         self.broken_typer = BrokenTyper(chain=True, exit_hook=self._exit_hook)
         self.broken_typer.command(self.main,     context=True, default=True)
         self.broken_typer.command(self.settings, context=True)
         self.commands()
         if ("--help" not in args) and (not self._built(True)):
+            self.pack = (self.pack or ShaderPack.find(type(self).__name__))
             self.build()
         self.broken_typer(args)
 
@@ -545,9 +665,17 @@ class ShaderScene(ShaderModule):
         Returns:
             File contents as text or bytes
         """
-        file = (self.directory/file)
+        key, file = str(file), (self.directory/file)
+
+        # Sources baked on the Scene's asset pack
+        if self.pack and ((data := self.pack.file(key, path=file)) is not None):
+            return data if bytes else data.decode()
+
         log.info(f"{self.who} Reading file ({file})")
-        return LoaderBytes(file) if bytes else LoaderString(file)
+        data = LoaderBytes(file) if bytes else LoaderString(file)
+        if self.pack and (data is not None):
+            self.pack.add_file(key, data if bytes else data.encode(), path=file)
+        return data
 
     def main(self,
         width:      Annotated[int,   Option("--width",      "-w", help="(🌵 Basic    ) Width  of the Rendering Resolution")]=1920,
@@ -560,10 +688,25 @@ class ShaderScene(ShaderModule):
         ssaa:       Annotated[float, Option("--ssaa",       "-s", help="(💎 Quality  ) Fractional Super Sampling Anti Aliasing factor, O(N²) GPU cost")]=1.0,
         render:     Annotated[bool,  Option("--render",     "-r", help="(📦 Exporting) Export the current Scene to a Video File defined on --output")]=False,
         output:     Annotated[str,   Option("--output",     "-o", help="(📦 Exporting) Output File Name: Absolute, Relative Path or Plain Name. Saved on ($DATA/$(plain_name or $scene-$date))")]=None,
-        format:     Annotated[str,   Option("--format",           help="(📦 Exporting) Output Video Container (mp4, mkv, webm, avi..), overrides --output one")]="mp4",
+        format:     Annotated[str,   Option("--format",           help="(📦 Exporting) Output Video Container (mp4, mkv, webm, avi..) or Image Sequence (png, tiff, jpg, exr..), overrides --output one")]="mp4",
         time:       Annotated[float, Option("--time-end",   "-t", help="(📦 Exporting) How many seconds to render, defaults to 10 or longest Audio")]=None,
-        raw:        Annotated[bool,  Option("--raw",              help="(📦 Exporting) Send raw OpenGL Frames before GPU SSAA to FFmpeg (Enabled if SSAA < 1)")]=False,
-        open:       Annotated[bool,  Option("--open",             help="(📦 Exporting) Open the Video's Output Directory after render finishes")]=False,
+        raw:        Annotated[bool,  Option("--raw",              help="(📦 Exporting) Send raw OpenGL Frames before GPU SSAA to FFmpeg, which scales them to the output resolution")]=False,
+        open:       Annotated[bool,  Option("--open/--no-open",   help="(📦 Exporting) Open the Video's Output Directory after render finishes")]=False,
+        pbos:       Annotated[int,   Option("--pbos",             help="(📦 Exporting) Pixel Buffer Objects ring length for asynchronous frames readback, 0 to disable")]=2,
+        queue:      Annotated[int,   Option("--queue",            help="(📦 Exporting) Frames queue depth of the FFmpeg writer thread, rendering only blocks when full")]=4,
+        start:      Annotated[float, Option("--time-start",       help="(📦 Exporting) Start writing frames at this time, modules are pre-rolled before it")]=0,
+        stop:       Annotated[float, Option("--time-stop",        help="(📦 Exporting) Stop writing frames at this time, defaults to the full duration")]=None,
+        preroll:    Annotated[float, Option("--preroll",          help="(📦 Exporting) Seconds simulated before --time-start without writing frames, warms up stateful modules")]=5,
+        audio:      Annotated[bool,  Option("--audio/--no-audio", help="(📦 Exporting) Add the Modules' FFmpeg inputs, such as audio files, to the output video")]=True,
+        workers:    Annotated[int,   Option("--workers",          help="(📦 Exporting) Render N time segments on parallel processes, then concatenate them losslessly")]=1,
+        yuv:        Annotated[bool,  Option("--yuv",              help="(📦 Exporting) Convert frames to YUV420 on the GPU, halves the bytes sent to FFmpeg")]=False,
+        segment:    Annotated[float, Option("--segment",          help="(📦 Exporting) Checkpoint the render as encoded segments of N seconds, 0 to disable")]=0,
+        resume:     Annotated[bool,  Option("--resume/--no-resume", help="(📦 Exporting) Skip the finished segments of a previous interrupted render of the same output, needs --segment or --workers")]=False,
+        threads:    Annotated[int,   Option("--threads",          help="(📦 Exporting) Encoder threads compressing Image Sequence frames, defaults to the CPU count")]=None,
+        trace:      Annotated[Path,  Option("--trace",            help="(🔧 Profiling) Record spans of all threads to a Chrome trace JSON file, for chrome://tracing or Perfetto")]=None,
+        progress:   Annotated[str,   Option("--progress",         help="(📦 Exporting) Stream JSON lines render progress to '-', 'fd:N', 'tcp://host:port', 'unix:/path' or a file")]=None,
+        budget:     Annotated[float, Option("--budget",           help="(🔧 Profiling) Frame budget in milliseconds of the slow frames watchdog (F3 dumps them), defaults to 1/fps")]=None,
+        alloc:      Annotated[bool,  Option("--profile-alloc",    help="(🔧 Profiling) Report the top allocating call sites and modules per frame with tracemalloc, slow")]=False,
     ) -> Optional[Path]:
 
         self.relay(Message.Shader.ReloadShaders)
@@ -576,6 +719,11 @@ class ShaderScene(ShaderModule):
         self.realtime  = not render
         self.rendering = render
         self.benchmark = benchmark
+
+        # A Scene built headless can't go real time, there's no window to present to
+        if self.realtime and (self.window is None):
+            log.error(f"{self.who} Scene was built headless, can't run in real time")
+            return None
         self.headless  = (self.rendering or self.benchmark)
 
         # Window configuration based on launch mode
@@ -589,9 +737,10 @@ class ShaderScene(ShaderModule):
         self.duration   = 0
         self.fullscreen = fullscreen
         self.title      = f"ShaderFlow | {self.__name__}"
+        self.frametimer.budget = (budget/1000 if budget else None)
 
-        # When rendering, let FFmpeg apply the SSAA, I trust it more (higher quality?)
-        if self.rendering and (raw or self.ssaa < 1):
+        # Optionally let FFmpeg apply the SSAA, else the final shader outputs the exact resolution
+        if self.rendering and raw:
             self.resolution = self.render_resolution
             self.ssaa = 1
 
@@ -614,125 +763,446 @@ class ShaderScene(ShaderModule):
         else:
             self.duration = self.duration or time or 10
 
-        if self.rendering:
-            import arrow
-
-            # Get video output path - if not absolute, save to data directory
-            output = Path(output or f"({arrow.utcnow().format('YYYY-MM-DD_HH-mm-ss')}) {self.__name__}")
-            output = output if output.is_absolute() else Broken.PROJECT.DIRECTORIES.DATA/output
-            output = output.with_suffix(output.suffix or f".{format}")
-
-            # Create FFmpeg process
-            self.ffmpeg = (
-                BrokenFFmpeg()
-                .quiet()
-                .overwrite()
-                .hwaccel(FFmpegHWAccel.Auto)
-                .format(FFmpegFormat.Rawvideo)
-                .pixel_format(FFmpegPixelFormat.RGB24)
-                .resolution(self.resolution)
-                .framerate(self.fps)
-                .filter(FFmpegFilterFactory.scale(output_resolution))
-                .filter(FFmpegFilterFactory.flip_vertical())
-                .input("-")
-            )
+        # Record spans from now on, all the modules' threads are running
+        if trace:
+            TRACER.start()
+        if alloc:
+            self.allocations.start()
+
+        # Range of frames to write, might be a segment of the full duration
+        stop = min(stop or self.duration, self.duration)
+
+        # Real time window loop
+        if not self.rendering:
+            while not self._quit:
+                self.eloop.next()
+            if trace: TRACER.save(trace)
+            if alloc: self.allocations.log()
+            return None
+
+        import arrow
+
+        # Get video output path - if not absolute, save to data directory
+        # Note: Resumed renders find the previous segments by the output, the default can't be timestamped
+        output = Path(output or (self.__name__ if resume else f"({arrow.utcnow().format('YYYY-MM-DD_HH-mm-ss')}) {self.__name__}"))
+        output = output if output.is_absolute() else Broken.PROJECT.DIRECTORIES.DATA/output
+        output = output.with_suffix(output.suffix or f".{format}")
+
+        # Image sequences are numbered files on a directory named after the output
+        if (sequence := (extension := output.suffix.lstrip(".").lower()) in ShaderImageWriter.formats):
+            if (workers > 1) or segment or resume:
+                log.warning(f"{self.who} Image sequences are written per frame, ignoring --workers, --segment and --resume")
+                workers, segment, resume = 1, 0, False
+
+        # A single segment is rendered from scratch, there's nothing to resume
+        if resume and not (segment or (workers > 1)):
+            raise ValueError(log.error(f"{self.who} Resuming needs a render split in segments, use --segment or --workers"))
+
+        # Checkpointed or parallel renders write segments, concatenated at the end
+        segments = ShaderSegments(
+            directory=output.parent/f"{output.name}.segments",
+            fps=self.fps, start=start, stop=stop,
+        )
+        segmented = (not self.benchmark) and (resume or bool(segment) or (workers > 1))
 
-            # Fixme: Is this the correct point for modules to manage FFmpeg?
-            for module in self.modules:
-                module.ffmpeg(self.ffmpeg)
-
-            # Add empty audio track if no input audio
-            # self.ffmpeg = (
-            #     self.ffmpeg
-            #     .custom("-f lavfi -i anullsrc=channel_layout=stereo:sample_rate=44100".split())
-            #     .shortest()
-            # )
-
-            # Todo: Apply preset based config
-            self.ffmpeg = (
-                self.ffmpeg
-                .video_codec(FFmpegVideoCodec.H264)
-                .audio_codec(FFmpegAudioCodec.AAC)
-                .audio_bitrate("300k")
-                .preset(FFmpegH264Preset.Slow)
-                .tune(FFmpegH264Tune.Film)
-                .quality(FFmpegH264Quality.High)
-                .pixel_format(FFmpegPixelFormat.YUV420P)
-                .custom("-t", self.duration)
-                .custom("-movflags", "+faststart")
+        if segmented:
+            parts = math.ceil((stop - start)/segment) if segment else workers
+            plan  = segments.plan(parts=max(1, parts), resume=resume)
+        else:
+            plan  = [(None, segments.first, segments.last)]
+
+        # Split the render across processes, each one renders some segments of the video
+        if segmented and (workers > 1):
+            if progress:
+                progress = ShaderProgress(target=progress, total=sum(last - first for (_, first, last) in plan)).open()
+                progress.emit("start", scene=self.__name__, output=str(output), total=progress.total,
+                    fps=self.fps, resolution=self.resolution, start=start, stop=stop, workers=workers)
+            self._render_workers(segments, plan, workers, output, progress)
+            output = self._finish_segments(segments, output, audio, open)
+            if progress: progress.close(frames=progress.total, output=str(output))
+            if trace: TRACER.save(trace)
+            return output
+
+        # Image encoders take RGB frames
+        if yuv and sequence:
+            log.warning(f"{self.who} Image sequences are encoded from RGB frames, ignoring --yuv")
+            yuv = False
+
+        # Chroma subsampling needs even dimensions
+        if yuv and (self.width % 2 or self.height % 2):
+            log.warning(f"{self.who} YUV420 conversion needs an even resolution, got {self.resolution}, using RGB")
+            yuv = False
+
+        # Pack the final image to YUV420 on the GPU, so FFmpeg doesn't have to
+        if yuv:
+            self._yuv = Shader(self, name="iYUV")
+            self._yuv.texture.components = 1
+            self._yuv.texture.dtype = "f1"
+            self._yuv.texture.track = False
+            self._yuv.texture.size = (self.width, self.height*3//2)
+            self._yuv.fragment = (SHADERFLOW.RESOURCES.FRAGMENT/"YUV420.glsl")
+
+        export = (self._yuv or self._final)
+
+        # Overlap GPU rendering of frame N+1 with the transfer of frame N
+        self.readback = ShaderReadback(scene=self, length=pbos)
+
+        # Encoder back-pressure shouldn't block the render loop
+        if sequence:
+            threads = (threads or os.cpu_count() or 1)
+
+            # Note: Two buffers per thread, but at most 512 MiB of frames on many cores nodes
+            self.writer = ShaderImageWriter(
+                directory=(output := output.with_suffix("")),
+                format=extension,
+                width=self.width,
+                height=self.height,
+                threads=threads,
+                depth=max(queue, min(2*threads, (512 << 20)//(self.width*self.height*3))),
+                size=self.width*self.height*3,
+                profiler=self.profiler,
             )
-
-            # Add output video
-            self.ffmpeg.output(output)
-            if not benchmark:
-                self.ffmpeg = self.ffmpeg.pipe()
-
-            # Add progress bar
-            progress_bar = tqdm.tqdm(
-                total=int(self.duration*self.fps),
-                desc=f"Scene ({type(self).__name__}) → Video",
-                dynamic_ncols=True,
-                colour="#43BFEF",
-                leave=False,
-                unit=" Frames",
-                mininterval=1/60,
-                maxinterval=0.1,
-                smoothing=0.1,
+        else:
+            self.writer = ShaderFrameWriter(
+                depth=queue,
+                size=(self.width*self.height*3//2 if yuv else self.width*self.height*3),
+                profiler=self.profiler,
             )
 
+        # Time each stage of the frames, pre-rolled ones included
+        self.profiler.start(frames=sum(last - max(0, first - round(preroll*self.fps)) for (_, first, last) in plan))
+
+        # Add progress bar
+        import tqdm
+        progress_bar = tqdm.tqdm(
+            total=sum(last - first for (_, first, last) in plan),
+            desc=f"Scene ({type(self).__name__}) → Video",
+            dynamic_ncols=True,
+            colour="#43BFEF",
+            leave=False,
+            unit=" Frames",
+            mininterval=1/60,
+            maxinterval=0.1,
+            smoothing=0.1,
+        )
+
+        # Machine readable progress for orchestrators
+        if progress:
+            progress = ShaderProgress(target=progress, total=progress_bar.total).open()
+            progress.emit("start", scene=self.__name__, output=str(output), total=progress.total,
+                fps=self.fps, resolution=self.resolution, start=start, stop=stop)
+
         import time
 
         # Benchmark and stats data
         RenderStatus = DotMap(
             render_start=time.perf_counter(),
             total_frames=0,
+            position=0,
         )
 
-        # Main rendering loop
-        while (self.rendering) or (not self._quit):
+        for index, first, last in plan:
+
+            # Warm up stateful modules before the first written frame of a discontinuous range
+            if (first != (tick := RenderStatus.position)):
+                tick = max(0, first - round(preroll*self.fps))
+                log.info(f"{self.who} Pre-rolling from ({tick/self.fps:.2f}s) to ({first/self.fps:.2f}s)")
+
+            if sequence:
+                self.writer.index = first
+            elif not self.benchmark:
+                self.writer.ffmpeg = self.ffmpeg = self._export_ffmpeg(
+                    output=(output if (index is None) else segments.path(index)),
+                    duration=(last - first)/self.fps,
+                    audio=(audio and not segmented),
+                    yuv=yuv,
+                    scale=(output_resolution if raw else None),
+                    start=first/self.fps,
+                )
+
+            # Fixed timestep loop, no event loop scheduling: frame N ends exactly at (N+1)/fps
+            for tick in range(tick, last):
+                mark = TRACER.now()
+                self.next(dt=self.frametime, time=(tick + 1)/self.fps, frame=(tick + 1))
+                TRACER.complete("Frame", mark)
+
+                # Pre-roll frames are simulated but not written
+                if (tick < first):
+                    continue
+
+                # Rendering logic
+                progress_bar.update(1)
+                RenderStatus.total_frames += 1
+
+                if progress:
+                    progress.update(
+                        frames=RenderStatus.total_frames,
+                        frame=tick,
+                        time=self.time,
+                        queue=self.writer.queued,
+                        written=self.writer.written,
+                    )
+
+                # Queue new frame readback, write the oldest finished one to FFmpeg
+                if not self.benchmark:
+                    mark = self.profiler.mark()
+                    if (frame := self.readback.read_into(
+                        fbo=export.texture.fbo(),
+                        acquire=self.writer.acquire,
+                        components=export.texture.components,
+                    )) is not None:
+                        self.writer.submit(frame)
+                    TRACER.complete("Readback", mark)
+                    self.profiler.lap("readback", mark)
+
+            RenderStatus.position = last
 
-            # Keep calling event loop until self was updated
-            if (_call := self.eloop.next().output) is not self:
-                continue
+            if not self.benchmark:
+                for frame in self.readback.flush_into(self.writer.acquire):
+                    self.writer.submit(frame)
+                self.writer.close()
+                if not sequence:
+                    self.ffmpeg.close()
+
+            # Checkpoint the finished segment
+            if segmented:
+                segments.mark(index)
+
+        self.readback.release()
+
+        # Log stats
+        progress_bar.refresh()
+        progress_bar.close()
+        RenderStatus.took = time.perf_counter() - RenderStatus.render_start
+        self.stats = RenderStatus
+
+        if progress:
+            progress.close(
+                frames=RenderStatus.total_frames,
+                fps=RenderStatus.total_frames/RenderStatus.took,
+                written=self.writer.written,
+                output=str(output),
+            )
+        log.info(f"Finished rendering ({output})", echo=not self.benchmark)
+        log.info((
+            f"• Stats: "
+            f"(Took {RenderStatus.took:.2f} s) at "
+            f"({RenderStatus.total_frames/RenderStatus.took:.2f} FPS | "
+            f"{(RenderStatus.total_frames/self.fps)/RenderStatus.took:.2f} x Realtime) with "
+            f"({RenderStatus.total_frames} Total Frames)"
+        ))
 
-            if not self.rendering:
-                continue
+        # Per stage breakdown, saved next to the output
+        self.profiler.enabled = False
+        self.profiler.log()
+        self.profiler.save(
+            path=output.parent/f"{output.name}.stages.json",
+            scene=self.__name__,
+            resolution=self.resolution,
+            ssaa=self.ssaa,
+            frames=RenderStatus.total_frames,
+            took=RenderStatus.took,
+        )
 
-            # Rendering logic
-            progress_bar.update(1)
-            RenderStatus.total_frames += 1
+        if trace:
+            TRACER.save(trace)
 
-            # Write new frame to FFmpeg
-            if not self.benchmark:
-                self.ffmpeg.write(self._final.texture.fbo().read())
+        if alloc:
+            self.allocations.stop()
+            self.allocations.log()
+            self.allocations.save(output.parent/f"{output.name}.alloc.json")
 
-            # Render until time and end are Close
-            if (self.duration - self.time) > 1.5*self.frametime:
-                continue
+        if self.benchmark:
+            return
 
-            if not self.benchmark:
-                self.ffmpeg.close()
-
-            # Log stats
-            progress_bar.refresh()
-            progress_bar.close()
-            RenderStatus.took = time.perf_counter() - RenderStatus.render_start
-            log.info(f"Finished rendering ({output})", echo=not self.benchmark)
-            log.info((
-                f"• Stats: "
-                f"(Took {RenderStatus.took:.2f} s) at "
-                f"({self.frame/RenderStatus.took:.2f} FPS | "
-                f"{self.duration/RenderStatus.took:.2f} x Realtime) with "
-                f"({RenderStatus.total_frames} Total Frames)"
-            ))
-
-            if self.benchmark:
-                return
-
-            # Open output directory
-            if open: BrokenPath.open_in_file_explorer(output.parent)
-            break
+        log.info((
+            f"• Writer: "
+            f"(Queue {self.writer.average:.2f} average, {self.writer.maximum}/{self.writer.depth} peak) "
+            f"(Stalled {self.writer.stall:.2f} s)"
+        ))
+
+        if segmented:
+            return self._finish_segments(segments, output, audio, open)
+
+        # Open output directory
+        if open: BrokenPath.open_in_file_explorer(output.parent)
+        return output
+
+    def _export_ffmpeg(self,
+        output: Path,
+        duration: Seconds,
+        audio: bool=True,
+        yuv: bool=False,
+        scale: Tuple[int, int]=None,
+        start: Seconds=0,
+    ) -> BrokenFFmpeg:
+        """Create the FFmpeg process encoding the exported raw frames into a video file"""
+        ffmpeg = (
+            BrokenFFmpeg()
+            .quiet()
+            .overwrite()
+            .hwaccel(FFmpegHWAccel.Auto)
+            .format(FFmpegFormat.Rawvideo)
+            .pixel_format(FFmpegPixelFormat.YUV420P if yuv else FFmpegPixelFormat.RGB24)
+            .resolution(self.resolution)
+            .framerate(self.fps)
+        )
+
+        # Frames are already upright, only scale raw ones
+        if scale:
+            ffmpeg.filter(FFmpegFilterFactory.scale(scale))
+
+        ffmpeg.input("-")
+
+        # Fixme: Is this the correct point for modules to manage FFmpeg?
+        self.export_start = start
+        for module in audio * list(self.modules):
+            module.ffmpeg(ffmpeg)
+
+        # Add empty audio track if no input audio
+        # ffmpeg = (
+        #     ffmpeg
+        #     .custom("-f lavfi -i anullsrc=channel_layout=stereo:sample_rate=44100".split())
+        #     .shortest()
+        # )
+
+        # Todo: Apply preset based config
+        ffmpeg = (
+            ffmpeg
+            .video_codec(FFmpegVideoCodec.H264)
+            .audio_codec(FFmpegAudioCodec.AAC)
+            .audio_bitrate("300k")
+            .preset(FFmpegH264Preset.Slow)
+            .tune(FFmpegH264Tune.Film)
+            .quality(FFmpegH264Quality.High)
+            .pixel_format(FFmpegPixelFormat.YUV420P)
+            .custom("-t", duration)
+            .custom("-movflags", "+faststart")
+        )
+
+        # Add output video
+        ffmpeg.output(output)
+        return ffmpeg.pipe()
+
+    def _render_workers(self,
+        segments: ShaderSegments,
+        plan: List[Tuple[int, int, int]],
+        workers: int,
+        output: Path,
+        progress: ShaderProgress=None,
+    ) -> None:
+        """Render missing segments on a pool of parallel processes, checkpointing finished ones"""
+        import json
+        import subprocess
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+
+        # Each worker loads the same Scene file with this Scene's arguments, overriding the range and output
+        script = Path(self.script or sys.modules[type(self).__module__].__file__)
+        args = self._without(self._args, "--workers", "--progress", "--trace")
+
+        # Workers stream their progress to a pipe each, summed up on the parent's stream
+        lock, done = threading.Lock(), {}
+
+        def report(index: int, frames: int, force: bool=False) -> None:
+            with lock:
+                done[index] = frames
+                progress.update(frames=sum(done.values()), segment=index, force=force)
+
+        def watch(index: int, command: List[str]) -> int:
+            read, write = os.pipe()
+            process = subprocess.Popen([*command, "--progress", f"fd:{write}"], pass_fds=(write,))
+            os.close(write)
+            with open(read, "r") as stream:
+                for line in stream:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    if (event.get("event") == "progress"):
+                        report(index, event["frames"])
+            return process.wait()
+
+        def worker(index: int, first: int, last: int) -> int:
+            log.info(f"{self.who} Worker renders segment ({index}) frames ({first} - {last})")
+            command = list(map(str, (
+                sys.executable, "-m", "ShaderFlow", script, type(self).__name__.lower(), *args,
+                "--workers",    1,
+                "--segment",    0,
+                "--time-end",   self.duration,
+                "--time-start", first/self.fps,
+                "--time-stop",  last/self.fps,
+                "--output",     segments.path(index),
+                "--no-audio",
+                "--no-resume",
+                "--no-open",
+                *(("--trace", output.parent/f"{output.name}.segment-{index:04d}.trace.json") if TRACER.enabled else ()),
+            )))
+            if (progress is None):
+                return subprocess.run(command).returncode
+
+            # Note: Inheriting file descriptors isn't supported on Windows, finished segments only
+            code = (watch(index, command) if (os.name == "posix") else subprocess.run(command).returncode)
+            if (code == 0):
+                report(index, last - first, force=True)
+            return code
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(worker, *job): job[0] for job in plan}
+            failed = 0
+            for future in futures:
+                if future.result() != 0:
+                    failed += 1
+                    continue
+                segments.mark(futures[future])
+
+        if failed:
+            raise RuntimeError(log.error(f"{self.who} ({failed}) render workers failed, resume with --resume --output \"{output}\""))
+
+    @staticmethod
+    def _without(args: List[str], *options: str) -> List[str]:
+        """Remove some options and their values from a command line"""
+        result, skip = [], False
+        for arg in args:
+            if skip:
+                skip = False
+            elif (arg in options):
+                skip = True
+            elif not arg.startswith(tuple(f"{option}=" for option in options)):
+                result.append(arg)
+        return result
+
+    def _finish_segments(self,
+        segments: ShaderSegments,
+        output: Path,
+        audio: bool,
+        open: bool,
+    ) -> Path:
+        """Concatenate all finished segments losslessly, the modules' inputs are added only once"""
+        ffmpeg = (
+            BrokenFFmpeg()
+            .quiet()
+            .overwrite()
+            .custom("-f", "concat", "-safe", "0")
+            .input(segments.concat())
+        )
 
+        self.export_start = segments.start
+        for module in audio * list(self.modules):
+            module.ffmpeg(ffmpeg)
+
+        (ffmpeg
+            .custom("-c:v", "copy")
+            .audio_codec(FFmpegAudioCodec.AAC)
+            .audio_bitrate("300k")
+            .custom("-t", segments.stop - segments.start)
+            .custom("-movflags", "+faststart")
+            .output(output)
+        ).run()
+
+        segments.remove()
+        log.info(f"Finished rendering ({output}) from ({segments.parts}) segments")
+        if open: BrokenPath.open_in_file_explorer(output.parent)
         return output
 
     # # Window related events
@@ -2,13 +2,15 @@ import contextlib
 import functools
 import itertools
 from multiprocessing import Process
+from pathlib import Path
+from time import perf_counter
 from typing import Any
+from typing import Dict
 from typing import Iterable
 from typing import List
 from typing import Self
 from typing import Tuple
 
-import imgui
 import moderngl
 import numpy
 from attr import Factory
@@ -16,17 +18,26 @@ from attr import define
 
 import Broken
 import ShaderFlow
+from Broken.Base import BrokenPath
 from Broken.Base import denum
 from Broken.Loaders.LoaderString import LoaderString
 from Broken.Logging import log
 from ShaderFlow import SHADERFLOW
 from ShaderFlow.Message import Message
 from ShaderFlow.Module import ShaderModule
+from ShaderFlow.Profiler import ShaderQueries
 from ShaderFlow.Texture import ShaderTexture
 from ShaderFlow.Variable import ShaderVariable
 from ShaderFlow.Variable import ShaderVariableDirection
 
 
+@functools.cache
+def _dump_directory() -> Path:
+    """The shaders dump directory, emptied once on the first dump of the session"""
+    directory = Broken.PROJECT.DIRECTORIES.DUMP
+    BrokenPath.resetdir(directory, echo=False)
+    return directory
+
 @define
 class Shader(ShaderModule):
     version:            int                  = 330
@@ -39,6 +50,7 @@ class Shader(ShaderModule):
     vertices:           List[float]          = Factory(list)
     vertex_variables:   set[ShaderVariable]  = Factory(set)
     fragment_variables: set[ShaderVariable]  = Factory(set)
+    queries:            Dict[int | str, ShaderQueries] = Factory(dict)
 
     def __post__(self):
         """Set default values for some variables"""
@@ -170,7 +182,7 @@ class Shader(ShaderModule):
 
     def dump_shaders(self, error: str=""):
         import rich
-        directory = Broken.PROJECT.DIRECTORIES.DUMP
+        directory = _dump_directory()
         log.error(f"{self.who} Dumping shaders to {directory}")
         (directory/f"{self.uuid}-frag.glsl").write_text(self.fragment)
         (directory/f"{self.uuid}-vert.glsl").write_text(self.vertex)
@@ -181,7 +193,11 @@ class Shader(ShaderModule):
 
     def _full_pipeline(self) -> Iterable[ShaderVariable]:
         for module in self.scene.modules:
-            yield from module.pipeline()
+            start = perf_counter()
+            variables = list(module.pipeline())
+            if self.scene.frametimer:
+                self.scene.frametimer.record(module, "pipeline", perf_counter() - start)
+            yield from variables
 
     def load_shaders(self, _vertex: str=None, _fragment: str=None) -> Self:
         log.info(f"{self.who} Reloading shaders")
@@ -233,6 +249,22 @@ class Shader(ShaderModule):
             instances=self.instances
         )
 
+    def _timed_render(self, fbo: moderngl.Framebuffer, layer: int | str) -> None:
+        """Render to a FBO within a GPU time query, recording the one issued some frames ago"""
+        if not (latency := self.scene.gpu_queries):
+            return self.render_fbo(fbo)
+        if (queries := self.queries.get(layer)) is None:
+            name = (f"layer{layer}" if isinstance(layer, int) else layer)
+            queries = self.queries[layer] = ShaderQueries(
+                opengl=self.scene.opengl, latency=latency,
+                stage=f"gpu {name}", label=f"gpu {self.name} {name}",
+            )
+        if (took := queries.result()) is not None:
+            self.scene.frametimer.record(self, queries.stage, took, current=False)
+            self.scene.profiler.add(queries.label, took)
+        with queries.time():
+            self.render_fbo(fbo)
+
     def render(self) -> None:
 
         for index, variable in enumerate(self._full_pipeline()):
@@ -243,19 +275,19 @@ class Shader(ShaderModule):
                 variable.value.use(index)
                 continue
 
-            # Optimization: Final shader doesn't need the full pipeline
-            if self.texture.final:
+            # Optimization: Final shader only needs the textures and output size
+            if self.texture.final and (variable.name not in ("iResolution", "iFlip")):
                 continue
 
             self.set_uniform(variable.name, variable.value)
 
         if self.texture.final:
-            self.render_fbo(self.texture.fbo())
+            self._timed_render(self.texture.fbo(), "final")
             return
 
         for layer, container in enumerate(self.texture.matrix[0]):
             self.set_uniform("iLayer", layer)
-            self.render_fbo(container.fbo)
+            self._timed_render(container.fbo, layer)
 
         self.texture.roll()
 
@@ -270,6 +302,7 @@ class Shader(ShaderModule):
                 self.scene._render_ui()
 
     def __ui__(self) -> None:
+        import imgui
         if imgui.button("Reload"):
             self.load_shaders()
         imgui.same_line()
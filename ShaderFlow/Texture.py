@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import re
 from collections import deque
+from pathlib import Path
 from typing import Any
 from typing import Deque
 from typing import Iterable
@@ -367,13 +368,27 @@ class ShaderTexture(ShaderModule):
     # Input and Output
 
     def from_image(self, image: LoadableImage) -> Self:
+        key = (str(image) if isinstance(image, (str, Path)) else None)
+        pack = self.scene.pack
+
+        # Upload straight from the Scene's memory mapped asset pack
+        if key and pack and ((data := pack.texture(key)) is not None):
+            return self.from_raw(data)
+
         image = LoaderImage(image)
         image = image.transpose(PIL.Image.FLIP_TOP_BOTTOM)
-        self.width, self.height = image.size
-        self.components = len(image.getbands())
-        self.dtype = TextureType.get(numpy.array(image).dtype.str[1:].replace("u", "f"))
+        data  = numpy.array(image)
+        if key and pack:
+            pack.add_texture(key, data)
+        return self.from_raw(data)
+
+    def from_raw(self, data: numpy.ndarray) -> Self:
+        """Upload an image's (height, width, components) array as decoded by PIL, already flipped"""
+        self.height, self.width = data.shape[:2]
+        self.components = (data.shape[2] if (data.ndim == 3) else 1)
+        self.dtype = TextureType.get(data.dtype.str[1:].replace("u", "f"))
         self.make()
-        self.write(image.tobytes())
+        self.write(data)
         return self
 
     def from_numpy(self, data: numpy.ndarray) -> Self:
@@ -2,7 +2,6 @@ from __future__ import annotations
 
 import Broken
 import ShaderFlow.Resources as ShaderFlowResources
-from Broken.Base import BrokenPath
 from Broken.Project import BrokenProject
 
 SHADERFLOW = PROJECT = BrokenProject(
@@ -13,6 +12,3 @@ SHADERFLOW = PROJECT = BrokenProject(
 )
 
 Broken.PROJECT = SHADERFLOW
-
-# Fixme: Required optimal? Maybe once when shaders fail
-BrokenPath.resetdir(SHADERFLOW.DIRECTORIES.DUMP, echo=False)
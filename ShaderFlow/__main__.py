@@ -1,8 +1,27 @@
 import ast
+import itertools
+import json
+import os
 import sys
+import time
+import tomllib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+from multiprocessing import get_context
 from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Annotated
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
 
+from attr import Factory
+from attr import define
+from typer import Argument
 from typer import Context
+from typer import Option
 from yaspin import kbi_safe_yaspin as yaspin
 
 import Broken
@@ -15,7 +34,10 @@ from Broken.Loaders.LoaderString import LoaderString
 from Broken.Logging import log
 from Broken.Project import BrokenApp
 from ShaderFlow import SHADERFLOW
-from ShaderFlow.Scene import ShaderScene
+
+# Scenes are only imported when one runs, listing them must not pay for the whole engine
+if TYPE_CHECKING:
+    from ShaderFlow.Scene import ShaderScene
 
 SHADERFLOW_ABOUT = """
 🌵 Imagine ShaderToy, on a Manim-like architecture. That's ShaderFlow.\n
@@ -24,13 +46,398 @@ SHADERFLOW_ABOUT = """
 ©️ Broken Source Software, AGPL-3.0-only License.
 """
 
+def default_scene_files() -> Iterable[Path]:
+    """Scene files shipped with ShaderFlow and the Community ones"""
+    yield from SHADERFLOW.DIRECTORIES.REPOSITORY.glob("Community/**/*.py")
+    yield from SHADERFLOW.RESOURCES.SCENES.glob("**/*.py")
+
+def scene_definitions(code: str, file: Path=None) -> List[Tuple[str, str]]:
+    """Names and docstrings of the classes inheriting from Scene on some code, without executing it"""
+
+    # Optimization: Only parse files with Scene on it
+    if ("ShaderScene" not in code):
+        return []
+
+    try:
+        parsed = ast.parse(code)
+    except Exception as e:
+        log.error(f"Failed to parse file ({file}): {e}")
+        return []
+
+    # Find all class definition inheriting from Scene
+    return [(node.name, ast.get_docstring(node, clean=False))
+        for node in ast.walk(parsed) if isinstance(node, ast.ClassDef)
+        and any(isinstance(base, ast.Name) and (base.id == "ShaderScene")
+            for base in node.bases)]
+
+@define
+class ShaderSceneCache:
+    """
+    Scenes found on each file, persisted across launches to skip reading and parsing them
+
+    • Entries are keyed by the file's path, and only valid for the same modification time and size
+    • The cache is only written back when some entry changed, launches on a stable tree are read-only
+    """
+    path:   Path = Factory(lambda: SHADERFLOW.DIRECTORIES.CACHE/"Scenes.json")
+    files:  Dict[str, dict] = None
+    _dirty: bool = False
+
+    # Bump when the entries format changes, invalidating older caches
+    version = 1
+
+    def load(self) -> Dict[str, dict]:
+        if (self.files is None):
+            try:
+                cache = json.loads(self.path.read_text())
+                self.files = (cache["files"] if (cache.get("version") == self.version) else {})
+            except (OSError, ValueError, KeyError):
+                self.files = {}
+        return self.files
+
+    def scenes(self, file: Path) -> List[Tuple[str, str]]:
+        """Cached or freshly parsed (name, docstring) of the Scenes on a file"""
+        try:
+            stat = file.stat()
+        except OSError:
+            return []
+        key = str(file.resolve())
+        if (entry := self.load().get(key)) and (entry["mtime"], entry["size"]) == (stat.st_mtime_ns, stat.st_size):
+            return [tuple(scene) for scene in entry["scenes"]]
+        scenes = scene_definitions(LoaderString(file) or "", file)
+        self.files[key] = dict(mtime=stat.st_mtime_ns, size=stat.st_size, scenes=scenes)
+        self._dirty = True
+        return scenes
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        self.files = {key: entry for key, entry in self.files.items() if Path(key).exists()}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(json.dumps(dict(version=self.version, files=self.files)))
+        except OSError as error:
+            log.warning(f"Couldn't save the scenes cache to ({self.path}): {error}")
+        self._dirty = False
+
+SCENE_CACHE = ShaderSceneCache()
+
+def scene_metadata(file: Path) -> List[Tuple[str, str]]:
+    """Names and docstrings of the Scenes on a file, from the cache when it's unchanged"""
+    if not (file := BrokenPath(file, valid=True)):
+        return []
+
+    # Skip hidden directories
+    if ("__" in str(file)):
+        return []
+
+    return SCENE_CACHE.scenes(file)
+
+def load_scene_file(file: Path) -> List[type["ShaderScene"]]:
+    """Execute a file and get the classes that inherit from Scene on it"""
+    from ShaderFlow.Scene import ShaderScene
+
+    # No Scene class found
+    if not scene_metadata(file):
+        return []
+
+    if not (code := LoaderString(file)):
+        return []
+
+    # Execute the file to get the classes, output to namespace dictionary
+    # NOTE: This is a dangerous operation, scene files should be trusted
+    try:
+        exec(compile(code, file.stem, "exec"), namespace := {})
+    except Exception as e:
+        log.error(f"Failed to execute file ({file}): {e}")
+        return []
+
+    # Find all scenes on the compiled namespace
+    return [scene for scene in namespace.values()
+        if isinstance(scene, type) and (ShaderScene in scene.__bases__)]
+
+# -------------------------------------------------------------------------------------------------|
+
+BENCH_RESOLUTIONS: Dict[str, Tuple[int, int]] = {
+    "720p":  (1280, 720),
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4k":    (3840, 2160),
+}
+
+# Scenes loaded once per batch worker process, by lowercase name
+_BATCH_SCENES: Dict[str, Tuple[Path, type["ShaderScene"]]] = {}
+
+def find_scenes(files: Iterable[Path]) -> Dict[str, Path]:
+    """Files of each Scene by lowercase name, from their metadata only"""
+    found = {}
+    for file in files:
+        for name, _ in scene_metadata(file):
+            found.setdefault(name.lower(), Path(file))
+    SCENE_CACHE.save()
+    return found
+
+def _batch_scene(name: str, file: str=None) -> Optional[Tuple[Path, type["ShaderScene"]]]:
+    """Only execute the file defining a Scene, the job's own file or a default one"""
+    if name not in _BATCH_SCENES:
+        files = ([BrokenPath(file)] if file else []) + list(default_scene_files())
+        if (path := find_scenes(files).get(name)):
+            for scene in load_scene_file(path):
+                _BATCH_SCENES[scene.__name__.lower()] = (path, scene)
+    return _BATCH_SCENES.get(name)
+
+def _batch_result(job: dict, error: str=None) -> dict:
+    return dict(name=job["name"], scene=job["scene"], **job.get("tags", {}), args=job["args"],
+        ok=False, error=error, wall=0.0, frames=0, fps=0.0)
+
+def _batch_job(job: dict) -> dict:
+    """Render a single batch job on the current worker process, never raises"""
+    result = _batch_result(job)
+    start = time.perf_counter()
+    instance = None
+    try:
+        name = job["scene"].lower()
+        if not (found := _batch_scene(name, job.get("file"))):
+            raise LookupError(f"No scene named ({job['scene']}) was found")
+        file, scene = found
+        SHADERFLOW.DIRECTORIES.CURRENT_SCENE = file.parent
+        instance = scene()
+        instance.script = file
+        try:
+            instance.cli(*job["args"])
+        except SystemExit as exit:
+            if exit.code:
+                raise RuntimeError(f"Scene exited with code ({exit.code})")
+        if (stats := instance.stats):
+            result.update(frames=stats.total_frames, fps=stats.total_frames/(stats.took or 1))
+        result.update(ok=True)
+    except Exception as error:
+        result.update(error=f"{type(error).__name__}: {error}")
+    finally:
+        if instance is not None:
+            instance._exit_hook()
+            instance.destroy()
+    result.update(wall=time.perf_counter() - start)
+    return result
+
+def run_jobs(jobs: List[dict], workers: int=1, recycle: int=0) -> List[dict]:
+    """
+    Run scene jobs on a pool of worker processes, returns their results as they finish
+
+    • Workers are reused for the whole batch, or replaced after `recycle` jobs if non zero
+    """
+    results = []
+
+    # Note: Spawned workers get a clean OpenGL and windowing state
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("spawn"),
+        max_tasks_per_child=(recycle or None),
+    ) as pool:
+        futures = {pool.submit(_batch_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as error:
+                result = _batch_result(futures[future], error=f"Worker died: {error}")
+            results.append(result)
+            if result["ok"]:
+                log.info(f"• Job ({result['name']}) took ({result['wall']:.2f}s) at ({result['fps']:.2f} FPS)")
+            else:
+                log.error(f"• Job ({result['name']}) failed: {result['error']}")
+
+    return sorted(results, key=lambda result: result["name"])
+
+def batch_jobs(manifest: dict) -> List[dict]:
+    """
+    Expand a batch manifest's jobs, each one is a scene and its command line options
+
+    • `[jobs.options]` are converted to flags, `width=1280` is `--width 1280`, `true` is a `--flag`
+    • `[jobs.matrix]` lists values of options to render all their combinations
+    • Jobs always render, and are saved to their name if no `--output` is given
+    """
+    def flags(options: dict) -> List[str]:
+        args = []
+        for key, value in options.items():
+            flag = "--" + key.replace("_", "-")
+            if (value is True):
+                args.append(flag)
+            elif (value is not False):
+                args.extend((flag, str(value)))
+        return args
+
+    jobs = []
+    for entry in manifest.get("jobs", []):
+        matrix = entry.get("matrix", {})
+        for values in itertools.product(*matrix.values()):
+            combination = dict(zip(matrix.keys(), values))
+            args = [*map(str, entry.get("args", [])), *flags(entry.get("options", {})), *flags(combination)]
+            name = "-".join((entry.get("name", entry["scene"]), *(f"{key}-{value}" for key, value in combination.items())))
+            name = f"{len(jobs):04d}-{name}"
+            if not any(arg in ("--output", "-o") for arg in args):
+                args.extend(("--output", name))
+            jobs.append(dict(name=name, scene=entry["scene"], file=entry.get("file"), args=[*args, "--render"]))
+    return jobs
+
+# -------------------------------------------------------------------------------------------------|
+
 class ShaderFlowManager(BrokenApp):
     def cli(self):
         self.broken_typer = BrokenTyper(description=SHADERFLOW_ABOUT)
+        self.broken_typer.command(self.batch, panel="📦 Exporting")
+        self.broken_typer.command(self.bench, panel="📦 Exporting")
+        self.broken_typer.command(self.microbench, panel="📦 Exporting")
+        self.broken_typer.command(self.pack, panel="📦 Exporting")
         with yaspin(text="Finding ShaderFlow Scenes"):
             self.find_all_scenes()
         self.broken_typer(sys.argv[1:], shell=Broken.RELEASE and BrokenPlatform.OnWindows)
 
+    def batch(self,
+        manifest: Annotated[Path, Argument(help="TOML file with a list of [[jobs]], each with a scene and its options")],
+        workers:  Annotated[int,  Option("--workers", "-w", help="Number of parallel worker processes, overrides the manifest's")]=None,
+        recycle:  Annotated[int,  Option("--recycle",       help="Restart a worker process after N jobs, 0 to reuse them for the whole batch")]=0,
+        summary:  Annotated[Path, Option("--summary",       help="JSON file with the per-job wall time, FPS and failures, defaults next to the manifest")]=None,
+    ) -> None:
+        """Render many Scenes from a manifest on a pool of worker processes, paying the startup once per worker"""
+        manifest = Path(manifest)
+        config   = tomllib.loads(manifest.read_text())
+        jobs     = batch_jobs(config)
+        workers  = (workers or config.get("workers") or os.cpu_count() or 1)
+        summary  = Path(summary or config.get("summary") or manifest.with_suffix(".summary.json"))
+        log.info(f"Running ({len(jobs)}) batch jobs from ({manifest}) on ({workers}) workers")
+
+        start   = time.perf_counter()
+        results = run_jobs(jobs, workers=workers, recycle=recycle)
+        took    = time.perf_counter() - start
+        failed = sum(not result["ok"] for result in results)
+        summary.write_text(json.dumps(dict(
+            manifest=str(manifest),
+            workers=workers,
+            took=took,
+            jobs=len(results),
+            failed=failed,
+            results=results,
+        ), indent=2))
+        log.info(f"Finished ({len(results) - failed}/{len(results)}) batch jobs in ({took:.2f}s), summary at ({summary})")
+        if failed:
+            exit(1)
+
+    def bench(self,
+        frames:      Annotated[int,  Option("--frames",      "-n", help="Number of frames to render on each configuration")]=300,
+        resolutions: Annotated[str,  Option("--resolutions", "-r", help="Comma separated resolutions, names (720p, 1080p, 1440p, 4k) or WxH")]="720p,1080p,4k",
+        ssaa:        Annotated[str,  Option("--ssaa",        "-s", help="Comma separated SSAA factors")]="1,2",
+        quality:     Annotated[str,  Option("--quality",     "-q", help="Comma separated quality levels")]="50,100",
+        scenes:      Annotated[str,  Option("--scenes",            help="Comma separated scene names to benchmark, defaults to all found ones")]=None,
+        software:    Annotated[bool, Option("--software",          help="Force Mesa's llvmpipe software rasterizer, for machines without a GPU")]=False,
+        output:      Annotated[Path, Option("--output",      "-o", help="Results table path, written as both .json and .csv")]=None,
+    ) -> None:
+        """Benchmark all Scenes headless over a matrix of resolutions, SSAA and quality levels"""
+        import csv
+
+        import arrow
+
+        # Software OpenGL is inherited by the spawned workers
+        if software:
+            os.environ["LIBGL_ALWAYS_SOFTWARE"] = "1"
+            os.environ["GALLIUM_DRIVER"] = "llvmpipe"
+
+        def values(string: str) -> List[str]:
+            return [value.strip() for value in string.split(",") if value.strip()]
+
+        found = find_scenes(default_scene_files())
+        names = [name.lower() for name in values(scenes)] if scenes else sorted(found)
+        jobs  = []
+
+        for name, resolution, factor, level in itertools.product(names, values(resolutions), values(ssaa), values(quality)):
+            if name not in found:
+                log.warning(f"No scene named ({name}) was found, skipping")
+                continue
+            width, height = BENCH_RESOLUTIONS.get(resolution.lower()) or map(int, resolution.lower().split("x"))
+            jobs.append(dict(
+                name=f"{name}-{width}x{height}-ssaa{factor}-q{level}",
+                scene=name,
+                file=str(found[name]),
+                tags=dict(width=width, height=height, ssaa=float(factor), quality=float(level)),
+                args=[
+                    "--benchmark",
+                    "--width", width, "--height", height,
+                    "--ssaa", factor, "--quality", level,
+                    "--fps", 60, "--time-end", frames/60,
+                ],
+            ))
+        for job in jobs:
+            job["args"] = list(map(str, job["args"]))
+
+        # Benchmarks run one at a time, not to compete for the GPU, on a fresh process each
+        log.info(f"Benchmarking ({len(jobs)}) configurations of ({frames}) frames each")
+        results = run_jobs(jobs, workers=1, recycle=1)
+
+        output = Path(output or Broken.PROJECT.DIRECTORIES.DATA/f"({arrow.utcnow().format('YYYY-MM-DD_HH-mm-ss')}) Benchmark")
+        output.with_suffix(".json").write_text(json.dumps(dict(
+            frames=frames,
+            software=software,
+            results=results,
+        ), indent=2))
+        with output.with_suffix(".csv").open("w", newline="") as file:
+            columns = ("scene", "width", "height", "ssaa", "quality", "frames", "fps", "wall", "ok", "error")
+            writer  = csv.DictWriter(file, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(results)
+
+        log.info(f"Saved benchmark results to ({output.with_suffix('.json')}) and ({output.with_suffix('.csv')})")
+        if any(not result["ok"] for result in results):
+            exit(1)
+
+    def microbench(self,
+        baseline:  Annotated[Path,  Option("--baseline",  "-b", help="Baseline JSON to compare against, or to write with --save")]=Path("microbench.json"),
+        save:      Annotated[bool,  Option("--save",            help="Save the results as the new baseline instead of comparing")]=False,
+        threshold: Annotated[float, Option("--threshold", "-t", help="Percentage slower than the baseline that counts as a regression")]=10,
+        only:      Annotated[str,   Option("--only",            help="Comma separated benchmark names to run, defaults to all")]=None,
+        duration:  Annotated[float, Option("--duration",        help="Seconds of each timing repeat")]=0.2,
+        repeats:   Annotated[int,   Option("--repeats",         help="Number of timing repeats, the best one is kept")]=5,
+    ) -> None:
+        """Microbenchmark the per-frame Python hot paths, exits non-zero on regressions"""
+        from ShaderFlow.Microbench import ShaderMicrobench
+
+        bench = ShaderMicrobench(duration=duration, repeats=repeats, threshold=threshold)
+        bench.run(only=(only.split(",") if only else None))
+
+        if save or not baseline.exists():
+            bench.save(baseline)
+            return
+
+        if (regressed := bench.compare(baseline)):
+            log.error(f"({len(regressed)}) hot paths regressed by more than ({threshold}%)")
+            exit(1)
+
+    def pack(self,
+        scene:  Annotated[str,  Argument(help="Name of the Scene to pack, as its command")],
+        file:   Annotated[Path, Option("--file",   "-f", help="Scene file to look for it first, defaults to the known ones")]=None,
+        output: Annotated[Path, Option("--output", "-o", help="Pack file path, defaults to where the Scene looks for it")]=None,
+    ) -> None:
+        """Bake a Scene's decoded textures and shader sources into a memory mapped asset pack"""
+        from ShaderFlow.Packing import ShaderPack
+        name  = scene.lower()
+        files = ([Path(file)] if file else []) + list(default_scene_files())
+
+        if not (path := find_scenes(files).get(name)):
+            log.error(f"No scene named ({scene}) was found")
+            exit(1)
+        if not (found := next((scene for scene in load_scene_file(path) if scene.__name__.lower() == name), None)):
+            log.error(f"Scene ({scene}) wasn't found after executing ({path})")
+            exit(1)
+
+        # Build the Scene headless, recording whatever it loads
+        SHADERFLOW.DIRECTORIES.CURRENT_SCENE = path.parent
+        instance = found()
+        instance.script = path
+        instance.headless = True
+        instance.pack = ShaderPack(recording=True)
+        try:
+            instance.build()
+            instance.pack.save(output or ShaderPack.default(found.__name__), scene=found.__name__, file=str(path))
+        finally:
+            instance._exit_hook()
+
     def find_all_scenes(self) -> list[Path]:
         """Find all Scenes: Project directory and current directory"""
         direct = sys.argv[1] if (len(sys.argv) > 1) else ""
@@ -42,73 +449,31 @@ class ShaderFlowManager(BrokenApp):
         elif BrokenPath(direct, valid=True):
             files.update(BrokenPath(sys.argv.pop(1)).glob("**/*.py"))
         else:
-            files.update(SHADERFLOW.DIRECTORIES.REPOSITORY.glob("Community/**/*.py"))
-            files.update(SHADERFLOW.RESOURCES.SCENES.glob("**/*.py"))
+            files.update(default_scene_files())
 
         # Add the files, exit if no scene was added
-        if sum(apply(self.add_scene_file, files)) == 0:
+        added = sum(apply(self.add_scene_file, files))
+        SCENE_CACHE.save()
+        if added == 0:
             log.warning("No ShaderFlow Scenes found")
             exit(1)
 
     def add_scene_file(self, file: Path) -> bool:
-        """Add classes that inherit from Scene from a file to the CLI"""
-        if not (file := BrokenPath(file, valid=True)):
-            return False
-
-        if not (code := LoaderString(file)):
-            return False
-
-        # Skip hidden directories
-        if ("__" in str(file)):
-            return False
-
-        # Optimization: Only parse files with Scene on it
-        if ("ShaderScene" not in code):
-            return False
-
-        # Find all class definition inheriting from Scene
-        classes = []
-
-        try:
-            parsed = ast.parse(code)
-        except Exception as e:
-            log.error(f"Failed to parse file ({file}): {e}")
-            return False
-
-        for node in ast.walk(parsed):
-            if not isinstance(node, ast.ClassDef):
-                continue
-            for base in node.bases:
-                if not isinstance(base, ast.Name):
-                    continue
-                if base.id != ShaderScene.__name__:
-                    continue
-                classes.append(node)
-
-        # No Scene class found
-        if not classes:
+        """Add the Scenes of a file to the CLI, the file is only executed when one of them runs"""
+        if not (scenes := scene_metadata(file)):
             return False
 
-        # Execute the file to get the classes, output to namespace dictionary
-        # NOTE: This is a dangerous operation, scene files should be trusted
-        try:
-            exec(compile(code, file.stem, "exec"), namespace := {})
-        except Exception as e:
-            log.error(f"Failed to execute file ({file}): {e}")
-            return False
-
-        # Find all scenes on the compiled namespace
-        for scene in namespace.values():
-            if not isinstance(scene, type):
-                continue
-            if ShaderScene not in scene.__bases__:
-                continue
+        for name, docstring in scenes:
 
             # "Decorator"-like function to create a function that runs the scene
-            def partial_run(scene: ShaderScene):
+            def partial_run(name: str):
                 def run_scene(ctx: Context):
+                    if not (scene := next((scene for scene in load_scene_file(file) if scene.__name__ == name), None)):
+                        log.error(f"Scene ({name}) wasn't found after executing ({file})")
+                        exit(1)
                     SHADERFLOW.DIRECTORIES.CURRENT_SCENE = file.parent
                     instance = scene()
+                    instance.script = file
                     instance.cli(*ctx.args)
                 return run_scene
 
@@ -119,9 +484,9 @@ class ShaderFlowManager(BrokenApp):
 
             # Create the command
             self.broken_typer.command(
-                callable=partial_run(scene),
-                name=scene.__name__.lower(),
-                help=f"{scene.__doc__ or 'No description available'}",
+                callable=partial_run(name),
+                name=name.lower(),
+                help=f"{docstring or 'No description available'}",
                 panel=panel,
                 add_help_option=False,
                 context=True,